@@ -1,5 +1,7 @@
+import argparse
 import sys
 import os
+import tempfile
 from pathlib import Path
 
 
@@ -10,8 +12,9 @@ def main():
     if str(package_dir) not in sys.path:
         sys.path.insert(0, str(package_dir))
 
-    from .server import mcp
+    from .server import mcp, print_banner
 
+    print_banner()
     print("Starting FastMCP File Server (stdio mode)", file=sys.stderr)
     print("Allowed path:", os.getenv("MCP_ALLOWED_PATH", "./allowed"), file=sys.stderr)
 
@@ -32,53 +35,52 @@ def main_http():
     if str(package_dir) not in sys.path:
         sys.path.insert(0, str(package_dir))
 
-    from .server import mcp, HTTP_PORT, tokens
+    from .server import mcp, HTTP_PORT, tokens, print_banner
 
-    port = HTTP_PORT
-    ignore_keys = False
+    parser = argparse.ArgumentParser(
+        prog="fastmcp-file-server-http",
+        description="FastMCP File Server - HTTP Mode",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            "Environment Variables:\n"
+            "  MCP_ALLOWED_PATH     Safe directory for file operations\n"
+            "  MCP_HTTP_PORT        HTTP server port\n"
+            "  MCP_READ_KEY         Read-only access token\n"
+            "  MCP_WRITE_KEY        Read/write access token\n"
+            "  MCP_ADMIN_KEY        Admin access token"
+        ),
+    )
+    # Accept the "http" mode selector used by `python -m fastmcp_file_server.cli http`
+    parser.add_argument("mode", nargs="?", choices=["http"], help=argparse.SUPPRESS)
+    parser.add_argument("--http", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=HTTP_PORT,
+        help=f"HTTP server port (default: {HTTP_PORT})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes; above 1 runs stateless HTTP (default: 1)",
+    )
+    parser.add_argument(
+        "--ignore-keys",
+        action="store_true",
+        help="Skip authentication warning (not recommended)",
+    )
+    args = parser.parse_args()
 
-    # Parse command line arguments
-    args = sys.argv[1:]
-    i = 0
-    while i < len(args):
-        if args[i] == "--port":
-            try:
-                if i + 1 < len(args):
-                    port = int(args[i + 1])
-                    i += 2
-                else:
-                    print("Error: --port requires a value", file=sys.stderr)
-                    sys.exit(1)
-            except ValueError:
-                print("Error: Invalid port number", file=sys.stderr)
-                sys.exit(1)
-        elif args[i] == "--ignore-keys":
-            ignore_keys = True
-            i += 1
-        elif args[i] == "--help" or args[i] == "-h":
-            print("FastMCP File Server - HTTP Mode", file=sys.stderr)
-            print("", file=sys.stderr)
-            print("Usage: fastmcp-file-server-http [OPTIONS]", file=sys.stderr)
-            print("", file=sys.stderr)
-            print("Options:", file=sys.stderr)
-            print("  --port PORT      HTTP server port (default: 8082)", file=sys.stderr)
-            print("  --ignore-keys    Skip authentication warning (not recommended)", file=sys.stderr)
-            print("  --help, -h       Show this help message", file=sys.stderr)
-            print("", file=sys.stderr)
-            print("Environment Variables:", file=sys.stderr)
-            print("  MCP_ALLOWED_PATH     Safe directory for file operations", file=sys.stderr)
-            print("  MCP_HTTP_PORT        HTTP server port", file=sys.stderr)
-            print("  MCP_READ_KEY         Read-only access token", file=sys.stderr)
-            print("  MCP_WRITE_KEY        Read/write access token", file=sys.stderr)
-            print("  MCP_ADMIN_KEY        Admin access token", file=sys.stderr)
-            sys.exit(0)
-        elif(args[i] == "--http" or args[i] == "http"):
-            i+=1
-        else:
-            print(f"Error: Unknown argument '{args[i]}'", file=sys.stderr)
-            print("Use --help for usage information", file=sys.stderr)
-            sys.exit(1)
+    if args.workers > 1 and os.name == "nt":
+        # Writes are serialized across workers with fcntl.flock
+        print("--workers above 1 is not supported on Windows", file=sys.stderr)
+        sys.exit(1)
 
+    port = args.port
+    ignore_keys = args.ignore_keys
+
+    print_banner()
     print(f"Starting FastMCP HTTP server on port {port}", file=sys.stderr)
     print("Allowed path:", os.getenv("MCP_ALLOWED_PATH", "./allowed"), file=sys.stderr)
 
@@ -120,8 +122,42 @@ def main_http():
             print("WARNING BYPASSED: Running without authentication (--ignore-keys)", file=sys.stderr)
         print("="*60, file=sys.stderr)
 
+    # Use uvloop's faster event loop for the HTTP transport when it is installed
+    try:
+        import asyncio
+
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
     try:
-        mcp.run(transport="http", port=port)
+        if args.workers > 1:
+            # Worker processes each import the server, so sessions cannot be
+            # shared between them; the app factory serves stateless HTTP
+            import fastmcp
+            import uvicorn
+
+            # Each worker has its own in-process write lock, so file writes
+            # are serialized across workers with an flock on a shared file
+            lock_fd, lock_path = tempfile.mkstemp(
+                prefix="fastmcp-file-server-", suffix=".lock"
+            )
+            os.close(lock_fd)
+            os.environ["MCP_WRITE_LOCK_FILE"] = lock_path
+            try:
+                uvicorn.run(
+                    "fastmcp_file_server.server:create_http_app",
+                    factory=True,
+                    host=fastmcp.settings.host,
+                    port=port,
+                    workers=args.workers,
+                )
+            finally:
+                os.unlink(lock_path)
+        else:
+            mcp.run(transport="http", port=port)
     except KeyboardInterrupt:
         print("\nServer stopped by user", file=sys.stderr)
     except Exception as e:
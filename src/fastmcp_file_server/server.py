@@ -1,22 +1,41 @@
+import base64
+import codecs
 import os
 import re
 import shutil
 import stat
+import sys
+import tempfile
+import threading
 import zipfile
 import hashlib
+import hmac
+import inspect
+import io
 import csv
 import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Annotated
-from functools import wraps
+from functools import lru_cache, partial, wraps
+from itertools import chain
 import difflib
+import fnmatch
 
+import anyio
 from fastmcp import FastMCP
 from fastmcp.server.auth import StaticTokenVerifier
 from fastmcp.server.dependencies import get_access_token
 from dotenv import load_dotenv
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 load_dotenv()
 # Configuration from environment
 ALLOWED_PATH = os.getenv("MCP_ALLOWED_PATH", "./allowed")
@@ -25,7 +44,14 @@ ALLOWED_EXTENSIONS = os.getenv(
     "MCP_ALLOWED_EXTENSIONS",
     ".txt,.json,.md,.csv,.log,.xml,.yaml,.yml,.conf,.cfg,.zip,.pdf,.jpg,.png",
 ).split(",")
+ALLOWED_EXTENSIONS_SET = frozenset(
+    ext.strip().lower() for ext in ALLOWED_EXTENSIONS if ext.strip()
+)
+EXTENSION_CHECK_ENABLED = bool(ALLOWED_EXTENSIONS_SET)
 HTTP_PORT = int(os.getenv("MCP_HTTP_PORT", "8082"))
+PATH_CACHE_SIZE = int(os.getenv("MCP_PATH_CACHE_SIZE", "0"))  # 0 disables
+WALK_CONCURRENCY = int(os.getenv("MCP_WALK_CONCURRENCY", "8"))  # 1 disables
+READ_CACHE_SIZE = int(os.getenv("MCP_READ_CACHE_SIZE", "16777216"))  # 16MB, 0 disables
 
 # Multi-tier access keys
 MCP_READ_KEY = os.getenv("MCP_READ_KEY")
@@ -47,36 +73,149 @@ if MCP_ADMIN_KEY:
         "scopes": ["read:files", "write:files", "edit:files", "delete:files"],
     }
 
+# Scope bitmasks so permission checks are a single integer AND per call
+SCOPE_BITS = {"read:files": 1, "write:files": 2, "edit:files": 4, "delete:files": 8}
+
+
+def scopes_to_mask(scopes) -> int:
+    """Fold scope names into a SCOPE_BITS bitmask (unknown scopes are ignored)"""
+    mask = 0
+    for scope in scopes:
+        mask |= SCOPE_BITS.get(scope, 0)
+    return mask
+
+
+token_masks = {
+    token: scopes_to_mask(config["scopes"]) for token, config in tokens.items()
+}
+
+
+class HashedTokenVerifier(StaticTokenVerifier):
+    """StaticTokenVerifier that does not leak token contents through timing
+
+    A plain dict lookup compares the presented bearer against stored secrets
+    with ==, which returns early on the first differing character. Here the
+    lookup is keyed on a keyed BLAKE2b digest of the token instead, and the
+    candidate secret is then confirmed with hmac.compare_digest.
+    """
+
+    def __init__(self, tokens: dict, required_scopes: list[str] | None = None):
+        super().__init__(tokens=tokens, required_scopes=required_scopes)
+        # Per-process key: digests never leave memory, so it need not persist
+        self.digest_key = os.urandom(32)
+        # Stored secrets are encoded once here, so each request only encodes
+        # the presented token
+        self.digests = {}
+        for token in tokens:
+            encoded = token.encode("utf-8")
+            self.digests[self.digest(encoded)] = (token, encoded)
+
+    def digest(self, encoded: bytes) -> bytes:
+        return hashlib.blake2b(encoded, digest_size=16, key=self.digest_key).digest()
+
+    async def verify_token(self, token: str):
+        presented = token.encode("utf-8")
+        stored = self.digests.get(self.digest(presented))
+        if stored is None or not hmac.compare_digest(presented, stored[1]):
+            return None
+        return await super().verify_token(stored[0])
+
+
 # Initialize with authentication if tokens are configured
 if tokens:
-    verifier = StaticTokenVerifier(tokens=tokens, required_scopes=["read:files"])
+    verifier = HashedTokenVerifier(tokens=tokens, required_scopes=["read:files"])
     mcp = FastMCP("Local File Server", auth=verifier)
 else:
     mcp = FastMCP("Local File Server")
 
+
+def create_http_app():
+    """Build a stateless HTTP app; used as the uvicorn factory for multi-worker mode"""
+    return mcp.http_app(stateless_http=True)
+
+
 # Set up base directory
 base_dir = Path(ALLOWED_PATH).resolve()
 base_dir.mkdir(parents=True, exist_ok=True)
+BASE_DIR_STR = str(base_dir)
+BASE_DIR_PREFIX = os.path.join(BASE_DIR_STR, "")
+
+
+# Held while a tool modifies files. Tools run on worker threads, so without
+# it two read-modify-write edits of one file could interleave and drop one
+write_lock = threading.Lock()
+# Set by the HTTP CLI when it runs several worker processes: write_lock only
+# serializes one process, so writes also take an flock on this shared file
+WRITE_LOCK_FILE = os.getenv("MCP_WRITE_LOCK_FILE")
+
+
+def with_write_lock(func, *args, **kwargs):
+    """Call func while holding write_lock and, if configured, WRITE_LOCK_FILE"""
+    with write_lock:
+        if not WRITE_LOCK_FILE:
+            return func(*args, **kwargs)
+
+        # Closing the file releases the flock
+        with open(WRITE_LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            return func(*args, **kwargs)
 
 
 # Validation decorators
 def requires_scopes(*required_scopes: str):
-    """Decorator to register tools with required scopes"""
+    """Decorator to register tools with required scopes
+
+    Synchronous tools are also moved onto a worker thread, so their blocking
+    file I/O never stalls the event loop serving other requests. Tools that
+    need more than read access modify files, so their bodies run under
+    write_lock; async tools take it around their own worker-thread calls.
+    """
+    unknown_scopes = [scope for scope in required_scopes if scope not in SCOPE_BITS]
+    if unknown_scopes:
+        raise ValueError(f"Unknown scopes: {', '.join(unknown_scopes)}")
+    required_mask = scopes_to_mask(required_scopes)
+    modifies_files = any(scope != "read:files" for scope in required_scopes)
 
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Validate scope
+        def check_scopes():
+            # Without configured tokens there is no auth provider, so a lookup
+            # would only ever return None
+            if not tokens:
+                return
+
             token = get_access_token()
             if token:
-                user_scopes = set(token.scopes)
-                required_scope_set = set(required_scopes)
-                if not required_scope_set.issubset(user_scopes):
-                    missing_scopes = required_scope_set - user_scopes
+                user_mask = token_masks.get(token.token)
+                if user_mask is None:
+                    user_mask = scopes_to_mask(token.scopes)
+                if user_mask & required_mask != required_mask:
+                    missing_scopes = [
+                        scope
+                        for scope in required_scopes
+                        if not user_mask & SCOPE_BITS[scope]
+                    ]
                     raise ValueError(
                         f"Insufficient permissions: requires {', '.join(missing_scopes)}"
                     )
-            return func(*args, **kwargs)
+
+        if inspect.iscoroutinefunction(func):
+            if not tokens:
+                return func
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                check_scopes()
+                return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        call = partial(with_write_lock, func) if modifies_files else func
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            # Validate scope on the event loop, where the request context lives
+            check_scopes()
+            return await anyio.to_thread.run_sync(partial(call, *args, **kwargs))
 
         return wrapper
 
@@ -85,23 +224,36 @@ def requires_scopes(*required_scopes: str):
 
 def validates_paths(*path_params, check_extensions=True):
     """Unified decorator to validate one or more file paths and optionally extensions"""
+    # If no path_params specified, default to single "file_path"
+    params_to_validate = path_params if path_params else ("file_path",)
 
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # If no path_params specified, default to single "file_path"
-            params_to_validate = path_params if path_params else ("file_path",)
+        # Resolve each path parameter's position and extension rule once, at
+        # decoration time, instead of re-deriving them on every call
+        parameter_names = list(inspect.signature(func).parameters)
+        missing = [p for p in params_to_validate if p not in parameter_names]
+        if missing:
+            raise ValueError(f"Path parameter '{missing[0]}' not found")
+
+        checks = tuple(
+            (
+                path_param,
+                parameter_names.index(path_param),
+                check_extensions and "dir" not in path_param.lower(),
+            )
+            for path_param in params_to_validate
+        )
 
-            validated_paths = {}
+        def validate_arguments(args, kwargs):
+            args = list(args)
 
-            for i, path_param in enumerate(params_to_validate):
+            for path_param, position, check_extension in checks:
                 # Get the path value - try kwargs first, then args
-                path_value = None
-
-                if path_param in kwargs:
+                in_kwargs = path_param in kwargs
+                if in_kwargs:
                     path_value = kwargs[path_param]
-                elif len(args) > i:
-                    path_value = args[i]
+                elif position < len(args):
+                    path_value = args[position]
                 else:
                     raise ValueError(f"Path parameter '{path_param}' not found")
 
@@ -113,153 +265,547 @@ def validates_paths(*path_params, check_extensions=True):
                     validated_path = validate_path(path_value)
 
                 # Validate extension if required (skip for directories or when disabled)
-                if check_extensions and "dir" not in path_param.lower():
-                    if not validate_file_extension(path_value):
-                        raise ValueError(
-                            f"File extension not allowed for {path_param}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
-                        )
+                if check_extension and not validate_file_extension(path_value):
+                    raise ValueError(
+                        f"File extension not allowed for {path_param}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+                    )
 
-                validated_paths[path_param] = validated_path
+                if in_kwargs:
+                    kwargs[path_param] = validated_path
+                else:
+                    args[position] = validated_path
 
-            # Update paths in kwargs or args
-            if all(param in kwargs for param in params_to_validate):
-                # All parameters are in kwargs
-                for param in params_to_validate:
-                    kwargs[param] = validated_paths[param]
-                return func(*args, **kwargs)
-            else:
-                # Some or all parameters are positional
-                new_args = tuple(
-                    (
-                        validated_paths[params_to_validate[i]]
-                        if i < len(params_to_validate)
-                        else args[i]
-                    )
-                    for i in range(len(args))
-                )
-                return func(*new_args, **kwargs)
+            return args, kwargs
+
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                args, kwargs = validate_arguments(args, kwargs)
+                return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            args, kwargs = validate_arguments(args, kwargs)
+            return func(*args, **kwargs)
 
         return wrapper
 
     return decorator
 
 
-print("FastMCP File Server initialized")
-print(f"Base directory: {base_dir}")
-print(f"Max file size: {MAX_FILE_SIZE / (1024*1024):.1f}MB")
+def print_banner():
+    """Print server configuration to stderr
 
+    Called from the CLI entry points rather than at import time, so importing
+    the module never writes to stdout (the stdio transport's JSON-RPC stream).
+    """
+    banner = "\n".join(
+        [
+            "FastMCP File Server initialized",
+            f"Base directory: {base_dir}",
+            f"Max file size: {MAX_FILE_SIZE / (1024*1024):.1f}MB",
+        ]
+    )
+    sys.stderr.write(banner + "\n")
 
-def validate_path(file_path: str) -> Path:
-    """Validate and resolve file path within allowed directory"""
-    clean_path = file_path.lstrip("/")
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def resolve_path(clean_path: str) -> Path:
+    """Resolve a path relative to the base directory and check containment
+
+    Memoized when MCP_PATH_CACHE_SIZE is set: only paths that pass the check
+    are cached, so a cache hit skips both the resolve() and the containment
+    test. Call resolve_path.cache_clear() after operations that remove or move
+    entries, since they may change how cached paths resolve. Changes made by
+    other processes (e.g. a directory swapped for a symlink) are not seen, so
+    the cache is off by default.
+    """
     full_path = (base_dir / clean_path).resolve()
 
-    if not str(full_path).startswith(str(base_dir)):
+    if not full_path.is_relative_to(base_dir):
         raise ValueError("Path outside allowed directory")
 
     return full_path
 
 
+def validate_path(file_path: str) -> Path:
+    """Validate and resolve file path within allowed directory"""
+    return resolve_path(file_path.lstrip("/"))
+
+
+def to_relative(path: Path | str) -> str:
+    """Render a validated path relative to base_dir for messages ("." for base_dir)
+
+    Validated paths always start with base_dir, so slicing off the known
+    prefix avoids building a new Path via relative_to.
+    """
+    path_str = str(path)
+    if path_str == BASE_DIR_STR:
+        return "."
+    if path_str.startswith(BASE_DIR_PREFIX):
+        return path_str[len(BASE_DIR_PREFIX) :]
+    return os.path.relpath(path_str, BASE_DIR_STR)
+
+
+# Shared pool for scanning directories concurrently during tree walks
+walk_executor = (
+    ThreadPoolExecutor(max_workers=WALK_CONCURRENCY, thread_name_prefix="walk")
+    if WALK_CONCURRENCY > 1
+    else None
+)
+# Directory listings a walk may read ahead of the entries it has yielded
+WALK_PREFETCH = 2 * WALK_CONCURRENCY
+
+
+def scan_directory(path: str) -> list:
+    """List a directory's entries, treating unreadable directories as empty"""
+    try:
+        with os.scandir(path) as it:
+            return list(it)
+    except OSError:
+        return []
+
+
+def subdirectories(entries: list) -> list:
+    """Paths of the entries to descend into (symlinked directories excluded)"""
+    return [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+
+
+def entry_matcher(pattern: str):
+    """Build a predicate equivalent to Path(entry.path).match(pattern)
+
+    Single-component patterns (the common "*.txt" case) only ever look at the
+    entry name, so they are compiled to a regex once instead of being
+    re-parsed by Path.match for every entry.
+    """
+    if "/" in pattern or os.sep in pattern:
+
+        def matches(entry):
+            return Path(entry.path).match(pattern)
+
+        return matches
+
+    flags = re.IGNORECASE if os.name == "nt" else 0
+    name_regex = re.compile(fnmatch.translate(pattern), flags)
+
+    def matches(entry):
+        return name_regex.match(entry.name) is not None
+
+    return matches
+
+
+def walk_entries(root: Path):
+    """Yield a DirEntry for everything below root, like Path.rglob("*")
+
+    Each directory's entries come from a single scandir call, so file types
+    are read from the directory listing instead of a stat per entry. Entries
+    are produced in the same order as rglob: a directory's children, then
+    each subdirectory in turn. Symlinked directories are listed but not
+    descended into, and unreadable directories are skipped.
+
+    The next few directories to be walked are scanned ahead of time on
+    walk_executor, so on cold caches several directory reads are in flight
+    at once. At most WALK_PREFETCH listings are held ahead of the caller,
+    and stopping the walk early cancels the scans not yet started.
+    """
+    stack = [os.fspath(root)]
+    pending = {}  # path -> future of its listing, for paths still on the stack
+    try:
+        while stack:
+            path = stack.pop()
+            future = pending.pop(path, None)
+            entries = future.result() if future else scan_directory(path)
+            stack.extend(reversed(subdirectories(entries)))
+
+            if walk_executor:
+                # The top of the stack is walked next
+                for next_path in reversed(stack[-WALK_PREFETCH:]):
+                    if len(pending) >= WALK_PREFETCH:
+                        break
+                    if next_path not in pending:
+                        pending[next_path] = walk_executor.submit(
+                            scan_directory, next_path
+                        )
+
+            yield from entries
+    finally:
+        for future in pending.values():
+            future.cancel()
+
+
 def validate_file_extension(file_path: str) -> bool:
-    """Validate file extension if restrictions are configured"""
-    if not ALLOWED_EXTENSIONS or ALLOWED_EXTENSIONS == [""]:
+    """Validate file extension if restrictions are configured
+
+    Takes the path as requested, not as resolved, so the allow-list applies
+    to the name the client used even when it is a symlink.
+    """
+    return (
+        not EXTENSION_CHECK_ENABLED
+        or Path(file_path).suffix.lower() in ALLOWED_EXTENSIONS_SET
+    )
+
+
+# LRU cache of decoded file text: path -> (stat stamp, content)
+read_cache = OrderedDict()
+read_cache_bytes = 0
+# Reads run in worker threads, so cache bookkeeping is serialized
+read_cache_lock = threading.RLock()
+
+
+def read_text_cached(file_path: Path) -> str:
+    """Read a file as UTF-8 text, serving repeat reads from an in-memory LRU
+
+    Entries are keyed on the path and validated against (inode, mtime, ctime,
+    size) on every hit, so edits made outside the server are still picked up.
+    The cache holds at most READ_CACHE_SIZE bytes of file data.
+    """
+    global read_cache_bytes
+
+    st = os.stat(file_path)
+    if stat.S_ISDIR(st.st_mode):
+        raise IsADirectoryError(file_path)
+
+    key = str(file_path)
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_ctime_ns, st.st_size)
+    with read_cache_lock:
+        cached = read_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            read_cache.move_to_end(key)
+            return cached[1]
+
+    content = file_path.read_text(encoding="utf-8")
+
+    with read_cache_lock:
+        invalidate_read_cache(file_path)
+        if st.st_size <= READ_CACHE_SIZE:
+            read_cache[key] = (stamp, content)
+            read_cache_bytes += st.st_size
+            while read_cache_bytes > READ_CACHE_SIZE:
+                evicted_stamp, _ = read_cache.popitem(last=False)[1]
+                read_cache_bytes -= evicted_stamp[3]
+    return content
+
+
+def invalidate_read_cache(file_path: Path | None = None) -> None:
+    """Drop one file from the read cache, or everything when no path is given"""
+    global read_cache_bytes
+
+    with read_cache_lock:
+        if file_path is None:
+            read_cache.clear()
+            read_cache_bytes = 0
+            return
+
+        cached = read_cache.pop(str(file_path), None)
+        if cached is not None:
+            read_cache_bytes -= cached[0][3]
+
+
+def utf8_size(text: str) -> int:
+    """Size of text once UTF-8 encoded, without encoding pure-ASCII strings"""
+    # isascii() reads a flag CPython already stores on the string
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-8"))
+
+
+def fits_size_limit(text: str, limit: int) -> bool:
+    """Whether text stays within limit bytes once UTF-8 encoded"""
+    # A character encodes to 1-4 bytes, so only strings between the two
+    # bounds need their exact size measured
+    length = len(text)
+    if length > limit:
+        return False
+    if length * 4 <= limit:
         return True
+    return utf8_size(text) <= limit
+
+
+def encode_content(content: str) -> bytes:
+    """Encode content as UTF-8 once, enforcing the file size limit"""
+    # Every character encodes to at least one byte, so an over-long string
+    # can be rejected without paying for the encode
+    if len(content) > MAX_FILE_SIZE:
+        raise ValueError(
+            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
+        )
+
+    encoded = content.encode("utf-8")
+    if len(encoded) > MAX_FILE_SIZE:
+        raise ValueError(
+            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
+        )
+    return encoded
+
+
+def create_new_file(file_path: Path, data: bytes) -> None:
+    """Create file_path with data; raises FileExistsError if it already exists
 
-    file_ext = Path(file_path).suffix.lower()
-    return file_ext in ALLOWED_EXTENSIONS
+    O_EXCL makes the existence check and the create a single atomic open,
+    so a concurrent writer can never be overwritten.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    try:
+        fd = os.open(file_path, flags, 0o666)
+    except FileNotFoundError:
+        # Parent directory missing: create it only when actually needed
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(file_path, flags, 0o666)
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+
+
+class AbortWrite(Exception):
+    """Raise inside atomic_open to discard the new contents without an error"""
+
+
+@contextmanager
+def atomic_open(file_path: Path):
+    """Open a binary stream whose contents replace the existing file_path on success
+
+    Data goes to a temporary sibling that is renamed over file_path with
+    os.replace once the block exits cleanly, so readers see either the old
+    or the new file and never a partial write. If the block raises, the
+    original is left untouched (AbortWrite is swallowed, anything else
+    propagates). The file's permission bits are preserved.
+    Raises FileNotFoundError if file_path does not exist.
+    """
+    st = os.stat(file_path)
+    if stat.S_ISDIR(st.st_mode):
+        raise IsADirectoryError(file_path)
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+    )
+    try:
+        os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp_path, file_path)
+    except BaseException as e:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        if not isinstance(e, AbortWrite):
+            raise
+
+
+def atomic_write(file_path: Path, data: bytes) -> None:
+    """Atomically replace the contents of the existing file_path with data"""
+    with atomic_open(file_path) as f:
+        f.write(data)
+
+
+def backup_file(file_path: Path, backup_path: str) -> None:
+    """Keep the current file_path at backup_path, as a hard link where possible"""
+    try:
+        os.link(file_path, backup_path)
+    except OSError:
+        shutil.copy2(file_path, backup_path)
+
+
+def atomic_write_many(contents: dict) -> None:
+    """Replace several existing files, all or nothing
+
+    Each file's data goes to its own temporary sibling first; if any write
+    fails, all temporary files are removed and no file is changed. Each
+    original is then backed up before its temporary file is renamed over
+    it, so if a later rename fails the files already replaced are restored.
+    Permission bits are preserved.
+    """
+    staged = []  # (file_path, temporary path)
+    backups = []  # (file_path, backup path), for files already replaced
+    try:
+        for file_path, data in contents.items():
+            st = os.stat(file_path)
+            if stat.S_ISDIR(st.st_mode):
+                raise IsADirectoryError(file_path)
+
+            fd, tmp_path = tempfile.mkstemp(
+                dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+            )
+            staged.append((file_path, tmp_path))
+            with os.fdopen(fd, "wb") as f:
+                os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+                f.write(data)
+
+        for file_path, tmp_path in staged:
+            # tmp_path is unique, so its .bak sibling is free
+            backup_path = f"{tmp_path}.bak"
+            backup_file(file_path, backup_path)
+            try:
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                os.unlink(backup_path)
+                raise
+            backups.append((file_path, backup_path))
+    except BaseException:
+        for file_path, backup_path in reversed(backups):
+            os.replace(backup_path, file_path)
+        for _, tmp_path in staged:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+        raise
+
+    for _, backup_path in backups:
+        os.unlink(backup_path)
+
+
+COPY_CHUNK_SIZE = 1 << 30
+TEXT_CHECK_CHUNK_SIZE = 1 << 20
+
+
+def copy_file_data(source: Path, dest: Path) -> None:
+    """Copy file contents and metadata, preferring in-kernel copy_file_range
+
+    Some filesystems (e.g. procfs-like or certain network mounts) make
+    copy_file_range report end of file without copying anything, so the
+    copied byte count is checked against the source size and the copy is
+    redone with shutil.copyfile if they differ.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(source, "rb") as fsrc, open(dest, "wb") as fdst:
+                offset = 0
+                while True:
+                    copied = os.copy_file_range(
+                        fsrc.fileno(), fdst.fileno(), COPY_CHUNK_SIZE
+                    )
+                    if not copied:
+                        break
+                    offset += copied
+                complete = offset == os.fstat(fsrc.fileno()).st_size
+        except OSError:
+            # Unsupported here (e.g. cross-device on old kernels)
+            complete = False
+        if not complete:
+            shutil.copyfile(source, dest)
+        shutil.copystat(source, dest)
+        return
+
+    shutil.copy2(source, dest)
 
 
 @mcp.tool()
 @requires_scopes("write:files")
 @validates_paths("file_path")
-def create_file(
+async def create_file(
     file_path: Annotated[str, "Path to create the file"],
     content: Annotated[str, "Content to write"],
 ) -> str:
     """Create a new file with the given content"""
     # file_path is now a validated Path object
-    if file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
-        raise ValueError(f"File already exists: {rel_path}")
+    encoded = encode_content(content)
 
-    if len(content.encode("utf-8")) > MAX_FILE_SIZE:
-        raise ValueError(
-            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
+    rel_path = to_relative(file_path)
+    try:
+        await anyio.to_thread.run_sync(
+            with_write_lock, create_new_file, file_path, encoded
         )
+    except FileExistsError:
+        raise ValueError(f"File already exists: {rel_path}")
 
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    file_path.write_text(content, encoding="utf-8")
-
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully created {rel_path} with {len(content)} characters"
 
 
 @mcp.tool()
 @requires_scopes("read:files")
 @validates_paths("file_path", check_extensions=False)
-def read_file(file_path: Annotated[str, "Path to read the file"]) -> str:
+async def read_file(file_path: Annotated[str, "Path to read the file"]) -> str:
     """Read the contents of a file"""
     # file_path is now a validated Path object
+    rel_path = to_relative(file_path)
+
+    try:
+        content = await anyio.to_thread.run_sync(read_text_cached, file_path)
+    except FileNotFoundError:
+        raise ValueError(f"File does not exist: {rel_path}")
+    except IsADirectoryError:
+        raise ValueError(f"Path is a directory: {rel_path}")
+    except UnicodeDecodeError:
+        raise ValueError(f"File is not text readable: {rel_path}")
 
+    return f"File: {rel_path}\n\n{content}"
+
+
+@mcp.tool()
+@requires_scopes("read:files")
+@validates_paths("file_path")
+def read_file_bytes(file_path: Annotated[str, "Path to read the file"]) -> str:
+    """Read the raw bytes of a file (e.g. images, PDFs), base64-encoded"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     if file_path.is_dir():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Path is a directory: {rel_path}")
 
-    try:
-        content = file_path.read_text(encoding="utf-8")
-        rel_path = file_path.relative_to(base_dir)
-        return f"File: {rel_path}\n\n{content}"
-    except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
-        raise ValueError(f"File is not text readable: {rel_path}")
+    size = file_path.stat().st_size
+    if size > MAX_FILE_SIZE:
+        raise ValueError(
+            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
+        )
+
+    data = file_path.read_bytes()
+    encoded = base64.b64encode(data).decode("ascii")
+
+    return f"File: {rel_path} ({len(data)} bytes, base64)\n\n{encoded}"
 
 
 @mcp.tool()
 @requires_scopes("write:files")
 @validates_paths("file_path")
-def write_file(
+async def write_file(
     file_path: Annotated[str, "Path to write the file"],
     content: Annotated[str, "Content to write"],
 ) -> str:
     """Write content to an existing file"""
     # file_path is now a validated Path object
-    if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
-        raise ValueError(f"File does not exist: {rel_path}")
+    rel_path = to_relative(file_path)
+    encoded = encode_content(content)
 
-    if len(content.encode("utf-8")) > MAX_FILE_SIZE:
-        raise ValueError(
-            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
+    try:
+        await anyio.to_thread.run_sync(
+            with_write_lock, atomic_write, file_path, encoded
         )
+        invalidate_read_cache(file_path)
+    except FileNotFoundError:
+        raise ValueError(f"File does not exist: {rel_path}")
+    except IsADirectoryError:
+        raise ValueError(f"Path is a directory: {rel_path}")
 
-    file_path.write_text(content, encoding="utf-8")
-
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully wrote {len(content)} characters to {rel_path}"
 
 
 @mcp.tool()
 @requires_scopes("delete:files")
 @validates_paths("file_path", check_extensions=False)
-def delete_file(file_path: Annotated[str, "Path to delete the file"]) -> str:
+async def delete_file(file_path: Annotated[str, "Path to delete the file"]) -> str:
     """Delete a file"""
     # file_path is now a validated Path object
 
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     if file_path.is_dir():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Cannot delete directory: {rel_path}")
 
-    file_path.unlink()
+    await anyio.to_thread.run_sync(with_write_lock, file_path.unlink)
+    resolve_path.cache_clear()
+    invalidate_read_cache(file_path)
 
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully deleted {rel_path}"
 
 
@@ -272,23 +818,26 @@ def list_files(directory_path: Annotated[str, "Directory path to list"] = ".") -
     target_path = directory_path
 
     if not target_path.exists():
-        raise ValueError(
-            f"Directory does not exist: {target_path.relative_to(base_dir)}"
-        )
+        raise ValueError(f"Directory does not exist: {to_relative(target_path)}")
 
     if target_path.is_file():
-        raise ValueError(f"Path is a file: {target_path.relative_to(base_dir)}")
+        raise ValueError(f"Path is a file: {to_relative(target_path)}")
 
-    items = []
-    for item in sorted(target_path.iterdir()):
-        rel_path = item.relative_to(base_dir)
-        item_type = "directory" if item.is_dir() else "file"
-        items.append(f"{item_type}: {rel_path}")
+    # DirEntry.is_dir() uses the type cached from readdir, avoiding a stat per entry
+    with os.scandir(target_path) as entries:
+        sorted_entries = sorted(entries, key=lambda entry: entry.name)
+
+    relative_display = to_relative(target_path)
 
-    relative_display = (
-        target_path.relative_to(base_dir) if target_path != base_dir else "."
+    # Every entry shares the listed directory's relative prefix, so compute it
+    # once instead of calling relpath per entry
+    prefix = "" if target_path == base_dir else f"{relative_display}{os.sep}"
+    listing = "\n".join(
+        ("directory: " if entry.is_dir() else "file: ") + prefix + entry.name
+        for entry in sorted_entries
     )
-    return f"Contents of {relative_display}:\n" + "\n".join(items)
+
+    return f"Contents of {relative_display}:\n" + listing
 
 
 # Line-based operations
@@ -301,37 +850,41 @@ def read_lines(
     end_line: Annotated[int, "Ending line number (1-based, inclusive)"],
 ) -> str:
     """Read specific line ranges from a file"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     if file_path.is_dir():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Path is a directory: {rel_path}")
 
     try:
-        lines = file_path.read_text(encoding="utf-8").splitlines()
-
         # Convert to 0-based indexing
         start_idx = max(0, start_line - 1)
-        end_idx = min(len(lines), end_line)
 
-        if start_idx >= len(lines):
+        # Stream lines and stop once past end_line instead of splitting the
+        # whole file; splitlines() per physical line keeps the numbering
+        # identical to splitlines() on the full text
+        selected_lines = []
+        line_count = 0
+        with open(file_path, encoding="utf-8") as f:
+            lines = chain.from_iterable(line.splitlines() for line in f)
+            for line_count, line in enumerate(lines, 1):
+                if line_count > start_idx:
+                    if line_count > end_line:
+                        break
+                    selected_lines.append(line)
+
+        if line_count <= start_idx:
             raise ValueError(
-                f"Start line {start_line} exceeds file length ({len(lines)} lines)"
+                f"Start line {start_line} exceeds file length ({line_count} lines)"
             )
 
-        selected_lines = lines[start_idx:end_idx]
-        rel_path = file_path.relative_to(base_dir)
-
-        result = f"Lines {start_line}-{end_line} from {rel_path}:\n"
-        for i, line in enumerate(selected_lines, start=start_line):
-            result += f"{i}: {line}\n"
-
-        return result.rstrip()
+        body = "\n".join(
+            f"{i}: {line}" for i, line in enumerate(selected_lines, start=start_line)
+        )
+        return f"Lines {start_line}-{end_line} from {rel_path}:\n{body}".rstrip()
 
     except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File is not text readable: {rel_path}")
 
 
@@ -344,14 +897,13 @@ def write_lines(
     start_line: Annotated[int, "Starting line number (1-based) to replace from"],
 ) -> str:
     """Insert/replace specific lines in a file"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     try:
         existing_lines = file_path.read_text(encoding="utf-8").splitlines()
     except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File is not text readable: {rel_path}")
 
     # Convert to 0-based indexing
@@ -368,14 +920,9 @@ def write_lines(
     )
 
     new_content = "\n".join(new_lines)
-    if len(new_content.encode("utf-8")) > MAX_FILE_SIZE:
-        raise ValueError(
-            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
-        )
-
-    file_path.write_text(new_content, encoding="utf-8")
+    encoded = encode_content(new_content)
+    atomic_write(file_path, encoded)
 
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully wrote {len(lines_array)} lines to {rel_path} starting at line {start_line}"
 
 
@@ -388,14 +935,13 @@ def insert_lines(
     line_number: Annotated[int, "Line number (1-based) to insert after"],
 ) -> str:
     """Insert content at specific line number"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     try:
         existing_lines = file_path.read_text(encoding="utf-8").splitlines()
     except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File is not text readable: {rel_path}")
 
     # Convert to 0-based indexing
@@ -411,14 +957,9 @@ def insert_lines(
     )
 
     new_content = "\n".join(new_lines)
-    if len(new_content.encode("utf-8")) > MAX_FILE_SIZE:
-        raise ValueError(
-            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
-        )
-
-    file_path.write_text(new_content, encoding="utf-8")
+    encoded = encode_content(new_content)
+    atomic_write(file_path, encoded)
 
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully inserted {len(content_lines)} lines to {rel_path} at line {line_number}"
 
 
@@ -431,14 +972,13 @@ def delete_lines(
     end_line: Annotated[int, "Ending line number (1-based, inclusive)"],
 ) -> str:
     """Delete line ranges from a file"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     try:
         existing_lines = file_path.read_text(encoding="utf-8").splitlines()
     except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File is not text readable: {rel_path}")
 
     # Convert to 0-based indexing
@@ -457,10 +997,9 @@ def delete_lines(
     new_lines = existing_lines[:start_idx] + existing_lines[end_idx:]
 
     new_content = "\n".join(new_lines)
-    file_path.write_text(new_content, encoding="utf-8")
+    atomic_write(file_path, new_content.encode("utf-8"))
 
     deleted_count = end_line - start_line + 1
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully deleted {deleted_count} lines from {rel_path} (lines {start_line}-{end_line})"
 
 
@@ -472,29 +1011,45 @@ def append_lines(
     content: Annotated[str, "Content to append"],
 ) -> str:
     """Add lines to end of file"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
+    if file_path.is_dir():
+        raise ValueError(f"Path is a directory: {rel_path}")
+
+    # The existing content is decoded chunk by chunk only to check that it is
+    # UTF-8 text; it is never held whole or rewritten, and only its last
+    # byte is needed to decide on a separator
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    existing_size = 0
+    last_byte = b""
     try:
-        existing_content = file_path.read_text(encoding="utf-8")
+        with open(file_path, "rb") as f:
+            while True:
+                chunk = f.read(TEXT_CHECK_CHUNK_SIZE)
+                if not chunk:
+                    break
+                decoder.decode(chunk)
+                existing_size += len(chunk)
+                last_byte = chunk[-1:]
+        decoder.decode(b"", final=True)
     except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File is not text readable: {rel_path}")
 
     # Add newline if file doesn't end with one
-    separator = "" if existing_content.endswith("\n") else "\n"
-    new_content = existing_content + separator + content
+    separator = "" if last_byte in (b"\n", b"\r") else "\n"
+    appended = separator + content
 
-    if len(new_content.encode("utf-8")) > MAX_FILE_SIZE:
+    if not fits_size_limit(appended, MAX_FILE_SIZE - existing_size):
         raise ValueError(
             f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
         )
 
-    file_path.write_text(new_content, encoding="utf-8")
+    with open(file_path, "a", encoding="utf-8") as f:
+        f.write(appended)
 
     lines_added = len(content.splitlines())
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully appended {lines_added} lines to {rel_path}"
 
 
@@ -506,39 +1061,53 @@ def search_in_file(
     file_path: Annotated[str, "Path to search in"],
     pattern: Annotated[str, "Text pattern to search for"],
     regex: Annotated[bool, "Whether to use regex pattern matching"] = False,
+    max_matches: Annotated[int, "Stop after this many matches (0 for no limit)"] = 0,
 ) -> str:
     """Find text/patterns in a file"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     if file_path.is_dir():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Path is a directory: {rel_path}")
 
-    try:
-        content = file_path.read_text(encoding="utf-8")
-        lines = content.splitlines()
-    except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
-        raise ValueError(f"File is not text readable: {rel_path}")
+    # Compile once up front instead of per line
+    if regex:
+        try:
+            compiled = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid regex pattern: {e}")
+        is_match = compiled.search
+    else:
+
+        def is_match(line):
+            return pattern in line
 
     matches = []
+    truncated = False
 
-    for line_num, line in enumerate(lines, 1):
-        if regex:
-            try:
-                if re.search(pattern, line):
+    # Stream the file line by line rather than holding the text and a list of
+    # every line in memory at once; splitlines() per physical line keeps the
+    # numbering identical to read_lines
+    try:
+        with open(file_path, encoding="utf-8") as f:
+            lines = chain.from_iterable(line.splitlines() for line in f)
+            for line_num, line in enumerate(lines, 1):
+                if is_match(line):
+                    if max_matches > 0 and len(matches) == max_matches:
+                        truncated = True
+                        break
                     matches.append(f"{line_num}: {line}")
-            except re.error as e:
-                raise ValueError(f"Invalid regex pattern: {e}")
-        else:
-            if pattern in line:
-                matches.append(f"{line_num}: {line}")
+    except UnicodeDecodeError:
+        raise ValueError(f"File is not text readable: {rel_path}")
 
-    rel_path = file_path.relative_to(base_dir)
     if matches:
-        return f"Found {len(matches)} matches in {rel_path}:\n" + "\n".join(matches)
+        header = (
+            f"Showing first {len(matches)} matches in {rel_path}"
+            if truncated
+            else f"Found {len(matches)} matches in {rel_path}"
+        )
+        return f"{header}:\n" + "\n".join(matches)
     else:
         return f"No matches found for '{pattern}' in {rel_path}"
 
@@ -553,20 +1122,18 @@ def replace_in_file(
     all: Annotated[bool, "Replace all occurrences"] = True,
 ) -> str:
     """Find and replace text in a file"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     try:
         content = file_path.read_text(encoding="utf-8")
     except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File is not text readable: {rel_path}")
 
     # Count occurrences before replacement
     count = content.count(search)
     if count == 0:
-        rel_path = file_path.relative_to(base_dir)
         return f"No occurrences of '{search}' found in {rel_path}"
 
     # Perform replacement
@@ -577,14 +1144,9 @@ def replace_in_file(
         new_content = content.replace(search, replace, 1)
         replaced_count = 1
 
-    if len(new_content.encode("utf-8")) > MAX_FILE_SIZE:
-        raise ValueError(
-            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
-        )
-
-    file_path.write_text(new_content, encoding="utf-8")
+    encoded = encode_content(new_content)
+    atomic_write(file_path, encoded)
 
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully replaced {replaced_count} occurrence(s) of '{search}' in {rel_path}"
 
 
@@ -597,39 +1159,42 @@ def find_and_replace_lines(
     replacement: Annotated[str, "Replacement text for matched lines"],
 ) -> str:
     """Replace entire lines that match a pattern"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
+    replaced_count = 0
+    written = 0
+
+    # Single streaming pass: each line is copied or replaced straight into the
+    # temporary file, keeping its original line ending. The source is closed
+    # before atomic_open renames over it, which Windows requires
     try:
-        lines = file_path.read_text(encoding="utf-8").splitlines()
+        with atomic_open(file_path) as raw, io.TextIOWrapper(
+            raw, encoding="utf-8", newline=""
+        ) as dst:
+            with open(file_path, encoding="utf-8", newline="") as src:
+                for line in src:
+                    body = line.rstrip("\r\n")
+                    if line_pattern in body:
+                        line = replacement + line[len(body) :]
+                        replaced_count += 1
+
+                    written += utf8_size(line)
+                    if written > MAX_FILE_SIZE:
+                        raise ValueError(
+                            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
+                        )
+                    dst.write(line)
+
+            if replaced_count == 0:
+                raise AbortWrite
     except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File is not text readable: {rel_path}")
 
-    new_lines = []
-    replaced_count = 0
-
-    for line in lines:
-        if line_pattern in line:
-            new_lines.append(replacement)
-            replaced_count += 1
-        else:
-            new_lines.append(line)
-
     if replaced_count == 0:
-        rel_path = file_path.relative_to(base_dir)
         return f"No lines matching '{line_pattern}' found in {rel_path}"
 
-    new_content = "\n".join(new_lines)
-    if len(new_content.encode("utf-8")) > MAX_FILE_SIZE:
-        raise ValueError(
-            f"File size exceeds limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
-        )
-
-    file_path.write_text(new_content, encoding="utf-8")
-
-    rel_path = file_path.relative_to(base_dir)
     return f"Successfully replaced {replaced_count} line(s) matching '{line_pattern}' in {rel_path}"
 
 
@@ -643,26 +1208,23 @@ def copy_file(
 ) -> str:
     """Copy files"""
     # Both paths are now validated Path objects
+    rel_source = to_relative(source_path)
+    rel_dest = to_relative(dest_path)
     if not source_path.exists():
-        rel_source = source_path.relative_to(base_dir)
         raise ValueError(f"Source file does not exist: {rel_source}")
 
     if source_path.is_dir():
-        rel_source = source_path.relative_to(base_dir)
         raise ValueError(f"Source is a directory: {rel_source}")
 
     if dest_path.exists():
-        rel_dest = dest_path.relative_to(base_dir)
         raise ValueError(f"Destination already exists: {rel_dest}")
 
     # Create destination directory if needed
     dest_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Copy file
-    shutil.copy2(source_path, dest_path)
+    copy_file_data(source_path, dest_path)
 
-    rel_source = source_path.relative_to(base_dir)
-    rel_dest = dest_path.relative_to(base_dir)
     return f"Successfully copied {rel_source} to {rel_dest}"
 
 
@@ -675,26 +1237,25 @@ def move_file(
 ) -> str:
     """Move/rename files"""
     # Both paths are now validated Path objects
+    rel_source = to_relative(source_path)
+    rel_dest = to_relative(dest_path)
     if not source_path.exists():
-        rel_source = source_path.relative_to(base_dir)
         raise ValueError(f"Source file does not exist: {rel_source}")
 
     if source_path.is_dir():
-        rel_source = source_path.relative_to(base_dir)
         raise ValueError(f"Source is a directory: {rel_source}")
 
     if dest_path.exists():
-        rel_dest = dest_path.relative_to(base_dir)
         raise ValueError(f"Destination already exists: {rel_dest}")
 
     # Create destination directory if needed
     dest_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Move file
-    shutil.move(source_path, dest_path)
+    shutil.move(source_path, dest_path, copy_function=copy_file_data)
+    resolve_path.cache_clear()
+    invalidate_read_cache()
 
-    rel_source = source_path.relative_to(base_dir)
-    rel_dest = dest_path.relative_to(base_dir)
     return f"Successfully moved {rel_source} to {rel_dest}"
 
 
@@ -703,13 +1264,12 @@ def move_file(
 @validates_paths("file_path", check_extensions=False)
 def get_file_info(file_path: Annotated[str, "Path to get info for"]) -> str:
     """Get file size, modified date, and permissions"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     try:
         stat_info = file_path.stat()
-        rel_path = file_path.relative_to(base_dir)
 
         # File type
         file_type = "directory" if file_path.is_dir() else "file"
@@ -740,7 +1300,6 @@ Modified: {modified_str}
 Permissions: {perms}"""
 
     except Exception as e:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Cannot get info for {rel_path}: {e}")
 
 
@@ -750,7 +1309,7 @@ Permissions: {perms}"""
 def file_exists(file_path: Annotated[str, "Path to check"]) -> str:
     """Check if file exists"""
     exists = file_path.exists()
-    rel_path = file_path.relative_to(base_dir)
+    rel_path = to_relative(file_path)
 
     if exists:
         file_type = "directory" if file_path.is_dir() else "file"
@@ -765,14 +1324,13 @@ def file_exists(file_path: Annotated[str, "Path to check"]) -> str:
 @validates_paths("dir_path", check_extensions=False)
 def create_directory(dir_path: Annotated[str, "Directory path to create"]) -> str:
     """Create folders"""
+    rel_path = to_relative(dir_path)
     if dir_path.exists():
-        rel_path = dir_path.relative_to(base_dir)
         raise ValueError(f"Directory already exists: {rel_path}")
 
     # Create directory
     dir_path.mkdir(parents=True, exist_ok=True)
 
-    rel_path = dir_path.relative_to(base_dir)
     return f"Successfully created directory: {rel_path}"
 
 
@@ -784,12 +1342,11 @@ def delete_directory(
     recursive: Annotated[bool, "Delete recursively"] = False,
 ) -> str:
     """Remove folders"""
+    rel_path = to_relative(dir_path)
     if not dir_path.exists():
-        rel_path = dir_path.relative_to(base_dir)
         raise ValueError(f"Directory does not exist: {rel_path}")
 
     if not dir_path.is_dir():
-        rel_path = dir_path.relative_to(base_dir)
         raise ValueError(f"Path is not a directory: {rel_path}")
 
     # Check if directory is empty for non-recursive delete
@@ -797,7 +1354,6 @@ def delete_directory(
         try:
             contents = list(dir_path.iterdir())
             if contents:
-                rel_path = dir_path.relative_to(base_dir)
                 raise ValueError(
                     f"Directory not empty: {rel_path}. Use recursive=true to force delete"
                 )
@@ -809,8 +1365,9 @@ def delete_directory(
         shutil.rmtree(dir_path)
     else:
         dir_path.rmdir()
+    resolve_path.cache_clear()
+    invalidate_read_cache()
 
-    rel_path = dir_path.relative_to(base_dir)
     return f"Successfully deleted directory: {rel_path}"
 
 
@@ -823,29 +1380,30 @@ def list_files_recursive(
 ) -> str:
     """Deep directory listing with optional pattern matching"""
     if not dir_path.exists():
-        rel_path = dir_path.relative_to(base_dir)
+        rel_path = to_relative(dir_path)
         raise ValueError(f"Directory does not exist: {rel_path}")
 
     if not dir_path.is_dir():
-        rel_path = dir_path.relative_to(base_dir)
+        rel_path = to_relative(dir_path)
         raise ValueError(f"Path is not a directory: {rel_path}")
 
     items = []
+    matches = entry_matcher(pattern) if pattern else None
 
     # Walk through directory recursively
-    for item in dir_path.rglob("*"):
-        rel_path = item.relative_to(base_dir)
-
+    for entry in walk_entries(dir_path):
         # Apply pattern filter if provided
-        if pattern and not item.match(pattern):
+        if matches and not matches(entry):
             continue
 
-        item_type = "directory" if item.is_dir() else "file"
+        rel_path = to_relative(entry.path)
+
+        item_type = "directory" if entry.is_dir() else "file"
 
         # Add size info for files
-        if item.is_file():
+        if entry.is_file():
             try:
-                size = item.stat().st_size
+                size = entry.stat().st_size
                 if size > 1024 * 1024:
                     size_str = f" ({size / (1024 * 1024):.1f}MB)"
                 elif size > 1024:
@@ -858,7 +1416,7 @@ def list_files_recursive(
         else:
             items.append(f"{item_type}: {rel_path}/")
 
-    base_rel = dir_path.relative_to(base_dir) if dir_path != base_dir else "."
+    base_rel = to_relative(dir_path)
     pattern_str = f" (pattern: {pattern})" if pattern else ""
 
     if items:
@@ -876,26 +1434,25 @@ def move_directory(
 ) -> str:
     """Move folders"""
     # Both paths are now validated Path objects
+    rel_source = to_relative(source_path)
+    rel_dest = to_relative(dest_path)
     if not source_path.exists():
-        rel_source = source_path.relative_to(base_dir)
         raise ValueError(f"Source directory does not exist: {rel_source}")
 
     if not source_path.is_dir():
-        rel_source = source_path.relative_to(base_dir)
         raise ValueError(f"Source is not a directory: {rel_source}")
 
     if dest_path.exists():
-        rel_dest = dest_path.relative_to(base_dir)
         raise ValueError(f"Destination already exists: {rel_dest}")
 
     # Create parent directory if needed
     dest_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Move directory
-    shutil.move(source_path, dest_path)
+    shutil.move(source_path, dest_path, copy_function=copy_file_data)
+    resolve_path.cache_clear()
+    invalidate_read_cache()
 
-    rel_source = source_path.relative_to(base_dir)
-    rel_dest = dest_path.relative_to(base_dir)
     return f"Successfully moved directory {rel_source} to {rel_dest}"
 
 
@@ -918,21 +1475,21 @@ def batch_read(
             validated_path = validate_path(file_path_str)
 
             if not validated_path.exists():
-                rel_path = validated_path.relative_to(base_dir)
+                rel_path = to_relative(validated_path)
                 errors.append(f"{rel_path}: File does not exist")
                 continue
 
             if validated_path.is_dir():
-                rel_path = validated_path.relative_to(base_dir)
+                rel_path = to_relative(validated_path)
                 errors.append(f"{rel_path}: Path is a directory")
                 continue
 
             try:
                 content = validated_path.read_text(encoding="utf-8")
-                rel_path = validated_path.relative_to(base_dir)
+                rel_path = to_relative(validated_path)
                 results.append(f"=== {rel_path} ===\n{content}")
             except UnicodeDecodeError:
-                rel_path = validated_path.relative_to(base_dir)
+                rel_path = to_relative(validated_path)
                 errors.append(f"{rel_path}: File is not text readable")
 
         except Exception as e:
@@ -983,25 +1540,26 @@ def batch_create(
             # Validate path and extension
             validated_path = validate_path(file_path_str)
             if not validate_file_extension(file_path_str):
-                rel_path = validated_path.relative_to(base_dir)
+                rel_path = to_relative(validated_path)
                 errors.append(f"{rel_path}: File extension not allowed")
                 continue
 
-            if validated_path.exists():
-                rel_path = validated_path.relative_to(base_dir)
-                errors.append(f"{rel_path}: File already exists")
-                continue
-
-            if len(content.encode("utf-8")) > MAX_FILE_SIZE:
-                rel_path = validated_path.relative_to(base_dir)
+            try:
+                encoded = encode_content(content)
+            except ValueError:
+                rel_path = to_relative(validated_path)
                 errors.append(f"{rel_path}: File size exceeds limit")
                 continue
 
-            # Create file
-            validated_path.parent.mkdir(parents=True, exist_ok=True)
-            validated_path.write_text(content, encoding="utf-8")
+            # Create file (fails atomically if it already exists)
+            try:
+                create_new_file(validated_path, encoded)
+            except FileExistsError:
+                rel_path = to_relative(validated_path)
+                errors.append(f"{rel_path}: File already exists")
+                continue
 
-            rel_path = validated_path.relative_to(base_dir)
+            rel_path = to_relative(validated_path)
             created.append(f"{rel_path} ({len(content)} characters)")
 
         except Exception as e:
@@ -1027,6 +1585,100 @@ def batch_create(
     return "\n\n".join(output_parts)
 
 
+def edit_write(content: str, operation: dict) -> str:
+    return operation["content"]
+
+
+def edit_replace(content: str, operation: dict) -> str:
+    count = -1 if operation.get("all", True) else 1
+    return content.replace(operation["search"], operation["replace"], count)
+
+
+# batch_edit operations: tool name -> (edit function, required fields)
+BATCH_EDIT_OPS = {
+    "write_file": (edit_write, ("content",)),
+    "replace_in_file": (edit_replace, ("search", "replace")),
+}
+
+
+@mcp.tool()
+@requires_scopes("write:files")
+def batch_edit(
+    operations_array: Annotated[
+        list,
+        "Array of objects with tool ('write_file' or 'replace_in_file'), "
+        "file_path and that tool's arguments",
+    ],
+) -> str:
+    """Apply several edits to existing files at once, all or nothing"""
+    if not operations_array:
+        raise ValueError("Operations array cannot be empty")
+
+    # Validate every operation before reading or writing any file
+    plan = []
+    for index, operation in enumerate(operations_array, 1):
+        if (
+            not isinstance(operation, dict)
+            or operation.get("tool") not in BATCH_EDIT_OPS
+            or "file_path" not in operation
+        ):
+            raise ValueError(
+                f"Operation {index}: must have 'file_path' and a 'tool' of "
+                + ", ".join(BATCH_EDIT_OPS)
+            )
+
+        edit, required_fields = BATCH_EDIT_OPS[operation["tool"]]
+        missing_fields = [field for field in required_fields if field not in operation]
+        if missing_fields:
+            raise ValueError(
+                f"Operation {index}: missing {', '.join(missing_fields)} field(s)"
+            )
+
+        string_fields = ("file_path", *required_fields)
+        invalid_fields = [
+            field for field in string_fields if not isinstance(operation[field], str)
+        ]
+        if invalid_fields:
+            raise ValueError(
+                f"Operation {index}: {', '.join(invalid_fields)} must be string(s)"
+            )
+
+        file_path = validate_path(operation["file_path"])
+        if not validate_file_extension(operation["file_path"]):
+            raise ValueError(
+                f"Operation {index}: File extension not allowed: {to_relative(file_path)}"
+            )
+        plan.append((file_path, edit, operation))
+
+    # Apply edits in memory, in order, so several edits to one file compose
+    staged = {}
+    for file_path, edit, operation in plan:
+        if file_path not in staged:
+            rel_path = to_relative(file_path)
+            if file_path.is_dir():
+                raise ValueError(f"Path is a directory: {rel_path}")
+            if not file_path.exists():
+                raise ValueError(f"File does not exist: {rel_path}")
+            try:
+                staged[file_path] = file_path.read_text(encoding="utf-8")
+            except UnicodeDecodeError:
+                raise ValueError(f"File is not text readable: {rel_path}")
+        staged[file_path] = edit(staged[file_path], operation)
+
+    encoded = {
+        file_path: encode_content(content) for file_path, content in staged.items()
+    }
+    atomic_write_many(encoded)
+    for file_path in encoded:
+        invalidate_read_cache(file_path)
+
+    edited = "\n".join(to_relative(file_path) for file_path in encoded)
+    return (
+        f"Successfully applied {len(plan)} edit(s) to {len(encoded)} file(s):\n"
+        + edited
+    )
+
+
 @mcp.tool()
 @requires_scopes("delete:files")
 def batch_delete(
@@ -1045,12 +1697,12 @@ def batch_delete(
             validated_path = validate_path(file_path_str)
 
             if not validated_path.exists():
-                rel_path = validated_path.relative_to(base_dir)
+                rel_path = to_relative(validated_path)
                 errors.append(f"{rel_path}: File does not exist")
                 continue
 
             if validated_path.is_dir():
-                rel_path = validated_path.relative_to(base_dir)
+                rel_path = to_relative(validated_path)
                 errors.append(
                     f"{rel_path}: Cannot delete directory (use delete_directory)"
                 )
@@ -1059,12 +1711,16 @@ def batch_delete(
             # Delete file
             validated_path.unlink()
 
-            rel_path = validated_path.relative_to(base_dir)
+            rel_path = to_relative(validated_path)
             deleted.append(str(rel_path))
 
         except Exception as e:
             errors.append(f"{file_path_str}: {str(e)}")
 
+    if deleted:
+        resolve_path.cache_clear()
+        invalidate_read_cache()
+
     output_parts = []
     if deleted:
         output_parts.append(
@@ -1089,20 +1745,29 @@ def find_files(
     content_pattern: Annotated[str, "Content pattern to search for (optional)"] = None,
 ) -> str:
     """Search for files by name and optionally by content"""
+    base_rel = to_relative(directory)
     if not directory.exists():
-        rel_path = directory.relative_to(base_dir)
-        raise ValueError(f"Directory does not exist: {rel_path}")
+        raise ValueError(f"Directory does not exist: {base_rel}")
 
     if not directory.is_dir():
-        rel_path = directory.relative_to(base_dir)
-        raise ValueError(f"Path is not a directory: {rel_path}")
+        raise ValueError(f"Path is not a directory: {base_rel}")
 
     # Find files matching name pattern
     matched_files = []
     try:
-        for file_path in directory.rglob(name_pattern):
-            if file_path.is_file():
-                matched_files.append(file_path)
+        if name_pattern and name_pattern not in ("**", ".", "..") and (
+            "/" not in name_pattern and os.sep not in name_pattern
+        ):
+            # Single-component patterns match entry names only, so the tree
+            # can be walked with concurrent scandir instead of rglob
+            matches = entry_matcher(name_pattern)
+            for entry in walk_entries(directory):
+                if matches(entry) and entry.is_file():
+                    matched_files.append(Path(entry.path))
+        else:
+            for file_path in directory.rglob(name_pattern):
+                if file_path.is_file():
+                    matched_files.append(file_path)
     except Exception as e:
         raise ValueError(f"Invalid name pattern: {e}")
 
@@ -1111,7 +1776,7 @@ def find_files(
         if matched_files:
             results = []
             for file_path in matched_files:
-                rel_path = file_path.relative_to(base_dir)
+                rel_path = to_relative(file_path)
                 try:
                     size = file_path.stat().st_size
                     if size > 1024 * 1024:
@@ -1124,13 +1789,11 @@ def find_files(
                 except (OSError, ValueError):
                     results.append(str(rel_path))
 
-            base_rel = directory.relative_to(base_dir) if directory != base_dir else "."
             return (
                 f"Found {len(matched_files)} file(s) matching '{name_pattern}' in {base_rel}:\n"
                 + "\n".join(results)
             )
         else:
-            base_rel = directory.relative_to(base_dir) if directory != base_dir else "."
             return f"No files matching '{name_pattern}' found in {base_rel}"
 
     # Search content in matched files
@@ -1148,21 +1811,20 @@ def find_files(
                     matching_lines.append(f"  {line_num}: {line}")
 
             if matching_lines:
-                rel_path = file_path.relative_to(base_dir)
+                rel_path = to_relative(file_path)
                 content_matches.append(
                     f"{rel_path} ({len(matching_lines)} matches):\n"
                     + "\n".join(matching_lines)
                 )
 
         except UnicodeDecodeError:
-            rel_path = file_path.relative_to(base_dir)
+            rel_path = to_relative(file_path)
             content_errors.append(f"{rel_path}: Not text readable")
         except Exception as e:
-            rel_path = file_path.relative_to(base_dir)
+            rel_path = to_relative(file_path)
             content_errors.append(f"{rel_path}: {str(e)}")
 
     output_parts = []
-    base_rel = directory.relative_to(base_dir) if directory != base_dir else "."
 
     if content_matches:
         output_parts.append(
@@ -1189,20 +1851,18 @@ def compare_files(
 ) -> str:
     """Compare two files for differences"""
     # Both paths are now validated Path objects
+    rel_path1 = to_relative(file1_path)
+    rel_path2 = to_relative(file2_path)
     if not file1_path.exists():
-        rel_path1 = file1_path.relative_to(base_dir)
         raise ValueError(f"First file does not exist: {rel_path1}")
 
     if not file2_path.exists():
-        rel_path2 = file2_path.relative_to(base_dir)
         raise ValueError(f"Second file does not exist: {rel_path2}")
 
     if file1_path.is_dir():
-        rel_path1 = file1_path.relative_to(base_dir)
         raise ValueError(f"First path is a directory: {rel_path1}")
 
     if file2_path.is_dir():
-        rel_path2 = file2_path.relative_to(base_dir)
         raise ValueError(f"Second path is a directory: {rel_path2}")
 
     try:
@@ -1211,9 +1871,6 @@ def compare_files(
     except UnicodeDecodeError as e:
         raise ValueError(f"File is not text readable: {e}")
 
-    rel_path1 = file1_path.relative_to(base_dir)
-    rel_path2 = file2_path.relative_to(base_dir)
-
     # Basic comparison
     if content1 == content2:
         return f"Files are identical: {rel_path1} and {rel_path2}"
@@ -1237,6 +1894,18 @@ File sizes: {len(content1)} vs {len(content2)} characters
 Use get_file_diff() to see detailed differences."""
 
 
+# Diff generators by get_file_diff format name
+DIFF_FORMATS = {
+    "unified": lambda lines1, lines2, name1, name2: difflib.unified_diff(
+        lines1, lines2, fromfile=name1, tofile=name2, lineterm=""
+    ),
+    "context": lambda lines1, lines2, name1, name2: difflib.context_diff(
+        lines1, lines2, fromfile=name1, tofile=name2, lineterm=""
+    ),
+    "ndiff": lambda lines1, lines2, name1, name2: difflib.ndiff(lines1, lines2),
+}
+
+
 @mcp.tool()
 @requires_scopes("read:files")
 @validates_paths("file1_path", "file2_path", check_extensions=False)
@@ -1248,20 +1917,18 @@ def get_file_diff(
 ) -> str:
     """Show detailed differences between two files"""
     # Both paths are now validated Path objects
+    rel_path1 = to_relative(file1_path)
+    rel_path2 = to_relative(file2_path)
     if not file1_path.exists():
-        rel_path1 = file1_path.relative_to(base_dir)
         raise ValueError(f"First file does not exist: {rel_path1}")
 
     if not file2_path.exists():
-        rel_path2 = file2_path.relative_to(base_dir)
         raise ValueError(f"Second file does not exist: {rel_path2}")
 
     if file1_path.is_dir():
-        rel_path1 = file1_path.relative_to(base_dir)
         raise ValueError(f"First path is a directory: {rel_path1}")
 
     if file2_path.is_dir():
-        rel_path2 = file2_path.relative_to(base_dir)
         raise ValueError(f"Second path is a directory: {rel_path2}")
 
     try:
@@ -1270,9 +1937,6 @@ def get_file_diff(
     except UnicodeDecodeError as e:
         raise ValueError(f"File is not text readable: {e}")
 
-    rel_path1 = file1_path.relative_to(base_dir)
-    rel_path2 = file2_path.relative_to(base_dir)
-
     # Quick identical check
     if content1 == content2:
         return f"Files are identical: {rel_path1} and {rel_path2}"
@@ -1281,30 +1945,10 @@ def get_file_diff(
     lines2 = content2.splitlines(keepends=True)
 
     # Generate diff based on format
-    if format == "unified":
-        diff_lines = list(
-            difflib.unified_diff(
-                lines1,
-                lines2,
-                fromfile=str(rel_path1),
-                tofile=str(rel_path2),
-                lineterm="",
-            )
-        )
-    elif format == "context":
-        diff_lines = list(
-            difflib.context_diff(
-                lines1,
-                lines2,
-                fromfile=str(rel_path1),
-                tofile=str(rel_path2),
-                lineterm="",
-            )
-        )
-    elif format == "ndiff":
-        diff_lines = list(difflib.ndiff(lines1, lines2))
-    else:
+    differ = DIFF_FORMATS.get(format)
+    if differ is None:
         raise ValueError("Invalid format. Use 'unified', 'context', or 'ndiff'")
+    diff_lines = list(differ(lines1, lines2, rel_path1, rel_path2))
 
     if not diff_lines:
         return f"Files are identical: {rel_path1} and {rel_path2}"
@@ -1330,16 +1974,15 @@ def create_zip(
     source_paths: Annotated[list, "Array of file/directory paths to include"],
 ) -> str:
     """Create a zip archive from files and directories"""
+    rel_path = to_relative(zip_path)
     if not source_paths:
         raise ValueError("Source paths array cannot be empty")
 
     # Validate zip file extension
     if not zip_path.suffix.lower() == ".zip":
-        rel_path = zip_path.relative_to(base_dir)
         raise ValueError(f"Zip file must have .zip extension: {rel_path}")
 
     if zip_path.exists():
-        rel_path = zip_path.relative_to(base_dir)
         raise ValueError(f"Zip file already exists: {rel_path}")
 
     # Validate all source paths
@@ -1348,7 +1991,7 @@ def create_zip(
         try:
             validated_source = validate_path(source_path_str)
             if not validated_source.exists():
-                rel_source = validated_source.relative_to(base_dir)
+                rel_source = to_relative(validated_source)
                 raise ValueError(f"Source does not exist: {rel_source}")
             validated_sources.append(validated_source)
         except Exception as e:
@@ -1361,18 +2004,18 @@ def create_zip(
         for source_path in validated_sources:
             if source_path.is_file():
                 # Add file
-                rel_source = source_path.relative_to(base_dir)
+                rel_source = to_relative(source_path)
                 zip_file.write(source_path, rel_source)
             elif source_path.is_dir():
                 # Add directory recursively
                 for file_path in source_path.rglob("*"):
                     if file_path.is_file():
-                        rel_source = file_path.relative_to(base_dir)
+                        rel_source = to_relative(file_path)
                         zip_file.write(file_path, rel_source)
 
     # Get created zip info
     zip_size = zip_path.stat().st_size
-    rel_zip = zip_path.relative_to(base_dir)
+    rel_zip = to_relative(zip_path)
 
     return f"Successfully created {rel_zip} ({zip_size} bytes) with {len(validated_sources)} source(s)"
 
@@ -1385,16 +2028,14 @@ def extract_zip(
     extract_to: Annotated[str, "Directory to extract to (optional)"] = None,
 ) -> str:
     """Extract a zip archive"""
+    rel_path = to_relative(zip_path)
     if not zip_path.exists():
-        rel_path = zip_path.relative_to(base_dir)
         raise ValueError(f"Zip file does not exist: {rel_path}")
 
     if zip_path.is_dir():
-        rel_path = zip_path.relative_to(base_dir)
         raise ValueError(f"Path is a directory: {rel_path}")
 
     if not zip_path.suffix.lower() == ".zip":
-        rel_path = zip_path.relative_to(base_dir)
         raise ValueError(f"File is not a zip archive: {rel_path}")
 
     # Determine extraction directory
@@ -1414,11 +2055,9 @@ def extract_zip(
                 if ".." in member or member.startswith("/"):
                     raise ValueError(f"Unsafe path in archive: {member}")
 
-                # Validate extraction path
-                extract_path = extract_dir / member
-                try:
-                    extract_path.resolve().relative_to(base_dir.resolve())
-                except ValueError:
+                # Validate extraction path (base_dir is already resolved)
+                extract_path = (extract_dir / member).resolve()
+                if not extract_path.is_relative_to(base_dir):
                     raise ValueError(
                         f"Archive would extract outside allowed directory: {member}"
                     )
@@ -1430,13 +2069,12 @@ def extract_zip(
             extracted_count = len(zip_file.namelist())
 
     except zipfile.BadZipFile:
-        rel_path = zip_path.relative_to(base_dir)
         raise ValueError(f"Invalid or corrupted zip file: {rel_path}")
     except Exception as e:
         raise ValueError(f"Extraction failed: {e}")
 
-    rel_zip = zip_path.relative_to(base_dir)
-    rel_extract = extract_dir.relative_to(base_dir)
+    rel_zip = to_relative(zip_path)
+    rel_extract = to_relative(extract_dir)
 
     return (
         f"Successfully extracted {rel_zip} to {rel_extract} ({extracted_count} items)"
@@ -1454,12 +2092,11 @@ def get_file_hash(
     ] = "sha256",
 ) -> str:
     """Calculate file hash for integrity verification"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     if file_path.is_dir():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Path is a directory: {rel_path}")
 
     # Validate algorithm
@@ -1477,12 +2114,10 @@ def get_file_hash(
 
         file_hash = hash_obj.hexdigest()
         file_size = file_path.stat().st_size
-        rel_path = file_path.relative_to(base_dir)
 
         return f"Hash ({algorithm}) for {rel_path}:\n{file_hash}\nFile size: {file_size} bytes"
 
     except Exception as e:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Cannot calculate hash for {rel_path}: {e}")
 
 
@@ -1496,12 +2131,11 @@ def append_to_file(
     add_newline: Annotated[bool, "Add newline before content"] = True,
 ) -> str:
     """Append content to end of file without overwriting"""
+    rel_path = to_relative(file_path)
     if not file_path.exists():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File does not exist: {rel_path}")
 
     if file_path.is_dir():
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Path is a directory: {rel_path}")
 
     try:
@@ -1515,10 +2149,8 @@ def append_to_file(
             append_content = content
 
         # Check total size after append
-        new_total_size = len(existing_content.encode("utf-8")) + len(
-            append_content.encode("utf-8")
-        )
-        if new_total_size > MAX_FILE_SIZE:
+        remaining = MAX_FILE_SIZE - utf8_size(existing_content)
+        if not fits_size_limit(append_content, remaining):
             raise ValueError(
                 f"File size would exceed limit of {MAX_FILE_SIZE / (1024*1024):.1f}MB"
             )
@@ -1528,15 +2160,12 @@ def append_to_file(
             f.write(append_content)
 
         lines_added = len(content.splitlines())
-        rel_path = file_path.relative_to(base_dir)
 
         return f"Successfully appended {len(content)} characters ({lines_added} lines) to {rel_path}"
 
     except UnicodeDecodeError:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"File is not text readable: {rel_path}")
     except Exception as e:
-        rel_path = file_path.relative_to(base_dir)
         raise ValueError(f"Cannot append to {rel_path}: {e}")
 
 
@@ -1550,20 +2179,18 @@ def convert_to_pdf(
 ) -> str:
     """Convert text documents to PDF"""
     # Both paths are now validated Path objects
+    rel_source = to_relative(file_path)
+    rel_output = to_relative(output_path)
     if not file_path.exists():
-        rel_source = file_path.relative_to(base_dir)
         raise ValueError(f"Source file does not exist: {rel_source}")
 
     if file_path.is_dir():
-        rel_source = file_path.relative_to(base_dir)
         raise ValueError(f"Source is a directory: {rel_source}")
 
     if not output_path.suffix.lower() == ".pdf":
-        rel_output = output_path.relative_to(base_dir)
         raise ValueError(f"Output file must have .pdf extension: {rel_output}")
 
     if output_path.exists():
-        rel_output = output_path.relative_to(base_dir)
         raise ValueError(f"Output file already exists: {rel_output}")
 
     try:
@@ -1623,15 +2250,12 @@ def convert_to_pdf(
         c.save()
 
         pdf_size = output_path.stat().st_size
-        rel_source = file_path.relative_to(base_dir)
-        rel_output = output_path.relative_to(base_dir)
 
         return f"Successfully converted {rel_source} to PDF: {rel_output} ({pdf_size} bytes)"
 
     except ImportError:
         raise ValueError("PDF conversion requires reportlab: uv add reportlab")
     except UnicodeDecodeError:
-        rel_source = file_path.relative_to(base_dir)
         raise ValueError(f"Source file is not text readable: {rel_source}")
     except Exception as e:
         raise ValueError(f"PDF conversion failed: {e}")
@@ -1647,16 +2271,15 @@ def convert_image_format(
 ) -> str:
     """Convert image between different formats"""
     # Both paths are now validated Path objects
+    rel_source = to_relative(image_path)
+    rel_output = to_relative(output_path)
     if not image_path.exists():
-        rel_source = image_path.relative_to(base_dir)
         raise ValueError(f"Source image does not exist: {rel_source}")
 
     if image_path.is_dir():
-        rel_source = image_path.relative_to(base_dir)
         raise ValueError(f"Source is a directory: {rel_source}")
 
     if output_path.exists():
-        rel_output = output_path.relative_to(base_dir)
         raise ValueError(f"Output file already exists: {rel_output}")
 
     # Validate format
@@ -1685,8 +2308,6 @@ def convert_image_format(
             img.save(output_path, format=format_upper)
 
         output_size = output_path.stat().st_size
-        rel_source = image_path.relative_to(base_dir)
-        rel_output = output_path.relative_to(base_dir)
 
         return f"Successfully converted {rel_source} to {format_upper}: {rel_output} ({output_size} bytes)"
 
@@ -1705,24 +2326,21 @@ def csv_to_json(
 ) -> str:
     """Convert CSV file to JSON format"""
     # Both paths are now validated Path objects
+    rel_source = to_relative(csv_path)
+    rel_output = to_relative(json_path)
     if not csv_path.exists():
-        rel_source = csv_path.relative_to(base_dir)
         raise ValueError(f"CSV file does not exist: {rel_source}")
 
     if csv_path.is_dir():
-        rel_source = csv_path.relative_to(base_dir)
         raise ValueError(f"Source is a directory: {rel_source}")
 
     if not csv_path.suffix.lower() == ".csv":
-        rel_source = csv_path.relative_to(base_dir)
         raise ValueError(f"Source file must be .csv: {rel_source}")
 
     if not json_path.suffix.lower() == ".json":
-        rel_output = json_path.relative_to(base_dir)
         raise ValueError(f"Output file must be .json: {rel_output}")
 
     if json_path.exists():
-        rel_output = json_path.relative_to(base_dir)
         raise ValueError(f"Output file already exists: {rel_output}")
 
     try:
@@ -1741,8 +2359,6 @@ def csv_to_json(
             json.dump(data, jsonfile, indent=2, ensure_ascii=False)
 
         output_size = json_path.stat().st_size
-        rel_source = csv_path.relative_to(base_dir)
-        rel_output = json_path.relative_to(base_dir)
 
         return f"Successfully converted {rel_source} to JSON: {rel_output} ({len(data)} records, {output_size} bytes)"
 
@@ -1759,24 +2375,21 @@ def json_to_csv(
 ) -> str:
     """Convert JSON file to CSV format"""
     # Both paths are now validated Path objects
+    rel_source = to_relative(json_path)
+    rel_output = to_relative(csv_path)
     if not json_path.exists():
-        rel_source = json_path.relative_to(base_dir)
         raise ValueError(f"JSON file does not exist: {rel_source}")
 
     if json_path.is_dir():
-        rel_source = json_path.relative_to(base_dir)
         raise ValueError(f"Source is a directory: {rel_source}")
 
     if not json_path.suffix.lower() == ".json":
-        rel_source = json_path.relative_to(base_dir)
         raise ValueError(f"Source file must be .json: {rel_source}")
 
     if not csv_path.suffix.lower() == ".csv":
-        rel_output = csv_path.relative_to(base_dir)
         raise ValueError(f"Output file must be .csv: {rel_output}")
 
     if csv_path.exists():
-        rel_output = csv_path.relative_to(base_dir)
         raise ValueError(f"Output file already exists: {rel_output}")
 
     try:
@@ -1811,13 +2424,10 @@ def json_to_csv(
             writer.writerows(data)
 
         output_size = csv_path.stat().st_size
-        rel_source = json_path.relative_to(base_dir)
-        rel_output = csv_path.relative_to(base_dir)
 
         return f"Successfully converted {rel_source} to CSV: {rel_output} ({len(data)} records, {len(fieldnames)} columns, {output_size} bytes)"
 
     except json.JSONDecodeError as e:
-        rel_source = json_path.relative_to(base_dir)
         raise ValueError(f"Invalid JSON in {rel_source}: {e}")
     except Exception as e:
         raise ValueError(f"JSON to CSV conversion failed: {e}")
\ No newline at end of file
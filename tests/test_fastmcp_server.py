@@ -1,53 +1,175 @@
 import asyncio
+import contextlib
+import itertools
 import json
+import os
+import socket
 import sys
-from pathlib import Path
+import tempfile
+import httpx
 import pytest
+import pytest_asyncio
+from fastmcp import Client
+from fastmcp.client.transports import StreamableHttpTransport
+
+# Small file size limit for the test server, so the limit can be hit cheaply
+MAX_FILE_SIZE = 1024
+
+# Environment variables holding the server's auth tokens
+AUTH_KEYS = ("MCP_READ_KEY", "MCP_WRITE_KEY", "MCP_ADMIN_KEY")
+
+# Handshake parameters are identical for every session
+INITIALIZE_PARAMS = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {},
+    "clientInfo": {"name": "test-client", "version": "1.0.0"},
+}
+
+
+def tool_call(name, **arguments):
+    """Build the (method, params) pair for a tools/call request"""
+    return "tools/call", {"name": name, "arguments": arguments}
+
+
+def assert_matches(actual, expected, path="response"):
+    """Assert that actual contains every key/value in expected, recursively"""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict), f"{path}: expected an object, got {actual!r}"
+        for key, value in expected.items():
+            assert key in actual, f"{path}: missing key {key!r}"
+            assert_matches(actual[key], value, f"{path}.{key}")
+    else:
+        assert actual == expected, f"{path}: expected {expected!r}, got {actual!r}"
+
+
+# Stateless calls that must fail: (case name, request, expected message)
+ERROR_CASES = [
+    (
+        "missing file",
+        tool_call("read_file", file_path="missing.txt"),
+        "does not exist",
+    ),
+    (
+        "path traversal",
+        tool_call("read_file", file_path="../../etc/passwd"),
+        "outside allowed directory",
+    ),
+    (
+        "disallowed extension",
+        tool_call("create_file", file_path="blocked.exe", content="x"),
+        "extension not allowed",
+    ),
+]
 
 
 class FastMCPTestClient:
     """Test client for FastMCP server"""
 
-    def __init__(self):
-        # Find the virtual environment python
-        project_root = Path(__file__).parent.parent
-        self.venv_python = project_root / "venv" / "bin" / "python"
-        self.server_script = project_root / "src" / "fastmcp_server.py"
+    def __init__(self, allowed_path):
+        self.allowed_path = str(allowed_path)
         self.process = None
-        self.request_id = 1
+        self.init_response = None
+        self.request_ids = itertools.count(1)
+        self.pending = {}
+        self.reader_task = None
+        self.writer_task = None
+        self.out_queue = asyncio.Queue()
 
     async def start_server(self):
         """Start the FastMCP server process"""
         self.process = await asyncio.create_subprocess_exec(
-            str(self.venv_python),
-            str(self.server_script),
+            sys.executable,
+            "-m",
+            "fastmcp_file_server.cli",
+            env={
+                **os.environ,
+                "MCP_ALLOWED_PATH": self.allowed_path,
+                "MCP_MAX_FILE_SIZE": str(MAX_FILE_SIZE),
+            },
             stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.DEVNULL,  # Ignore stderr to avoid parsing issues
         )
+        self.reader_task = asyncio.create_task(self.read_responses())
+        self.writer_task = asyncio.create_task(self.write_messages())
 
     async def stop_server(self):
         """Stop the server process"""
+        for task in (self.reader_task, self.writer_task):
+            if task:
+                task.cancel()
         if self.process:
             self.process.terminate()
             await self.process.wait()
 
-    async def send_request(self, method, params=None):
-        """Send JSON-RPC request"""
-        request = {"jsonrpc": "2.0", "id": self.request_id, "method": method}
+    async def write_messages(self):
+        """Flush queued messages, coalescing everything pending into one drain"""
+        while True:
+            data = await self.out_queue.get()
+            while not self.out_queue.empty():
+                data += self.out_queue.get_nowait()
+            self.process.stdin.write(data)
+            await self.process.stdin.drain()
+
+    async def read_responses(self):
+        """Route each response line to the request waiting on its id"""
+        while True:
+            response_line = await self.process.stdout.readline()
+            if not response_line:
+                break
+            response = json.loads(response_line)
+            future = self.pending.pop(response.get("id"), None)
+            if future and not future.done():
+                future.set_result(response)
+
+        # Server exited: fail whatever is still waiting
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Server closed stdout"))
+        self.pending.clear()
+
+    def build_request(self, method, params=None):
+        """Build a JSON-RPC request and register a future for its response"""
+        request = {"jsonrpc": "2.0", "id": next(self.request_ids), "method": method}
         if params:
             request["params"] = params
 
-        self.request_id += 1
+        self.pending[request["id"]] = asyncio.get_running_loop().create_future()
+        return request
 
-        # Send request
+    async def send_request(self, method, params=None):
+        """Send JSON-RPC request
+
+        Safe to run concurrently (e.g. with asyncio.gather): responses are
+        matched to requests by id, not by arrival order.
+        """
+        request = self.build_request(method, params)
+
+        # Queue request for the writer task
         request_json = json.dumps(request) + "\n"
-        self.process.stdin.write(request_json.encode())
-        await self.process.stdin.drain()
+        self.out_queue.put_nowait(request_json.encode())
+
+        # Wait for the matching response
+        return await self.pending[request["id"]]
+
+    async def call_tool(self, name, **arguments):
+        """Call a tool by name and return the JSON-RPC response"""
+        return await self.send_request(*tool_call(name, **arguments))
 
-        # Read response
-        response_line = await self.process.stdout.readline()
-        return json.loads(response_line.decode().strip())
+    async def send_batch(self, calls):
+        """Send several JSON-RPC requests as a single write
+
+        Requests are pipelined as newline-delimited messages; responses are
+        returned in request order regardless of the order the server answers.
+        """
+        requests = [self.build_request(method, params) for method, params in calls]
+        futures = [self.pending[request["id"]] for request in requests]
+
+        # Queue all requests as a single write
+        payload = "".join(json.dumps(request) + "\n" for request in requests)
+        self.out_queue.put_nowait(payload.encode())
+
+        return list(await asyncio.gather(*futures))
 
     async def send_notification(self, method, params=None):
         """Send JSON-RPC notification (no response expected)"""
@@ -55,222 +177,279 @@ class FastMCPTestClient:
         if params:
             notification["params"] = params
 
-        # Send notification
+        # Queue notification behind any pending requests
         notification_json = json.dumps(notification) + "\n"
-        self.process.stdin.write(notification_json.encode())
-        await self.process.stdin.drain()
+        self.out_queue.put_nowait(notification_json.encode())
 
+    async def initialize(self):
+        """Perform the MCP handshake, keeping the initialize response"""
+        self.init_response = await self.send_request("initialize", INITIALIZE_PARAMS)
+        await self.send_notification("notifications/initialized")
 
-@pytest.mark.asyncio
-async def test_server_initialization():
-    """Test server initialization"""
-    client = FastMCPTestClient()
 
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def client(tmp_path_factory):
+    """One initialized server shared by every test in the module"""
+    client = FastMCPTestClient(tmp_path_factory.mktemp("allowed"))
+    await client.start_server()
     try:
-        await client.start_server()
-
-        # Test initialization
-        init_response = await client.send_request(
-            "initialize",
-            {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {"name": "test-client", "version": "1.0.0"},
-            },
-        )
+        await client.initialize()
+        yield client
+    finally:
+        await client.stop_server()
 
-        assert "result" in init_response
-        assert init_response["result"]["serverInfo"]["name"] == "Local File Server"
 
-        # Send initialized notification
-        await client.send_notification("notifications/initialized")
+@pytest.mark.asyncio(loop_scope="module")
+async def test_server_initialization(client):
+    """Test server initialization"""
+    # The shared client was initialized when the server started
+    assert_matches(
+        client.init_response,
+        {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "result": {"serverInfo": {"name": "Local File Server"}},
+        },
+    )
 
-        print("Server initialization test passed")
-        return True
+    print("Server initialization test passed")
 
-    except Exception as e:
-        print(f"Server initialization test failed: {e}")
-        return False
 
-    finally:
-        await client.stop_server()
+@pytest.mark.asyncio(loop_scope="module")
+async def test_tools_list(client):
+    """Test tools listing"""
+    # Test tools/list
+    tools_response = await client.send_request("tools/list", {})
+
+    assert "result" in tools_response
+    tools = tools_response["result"]["tools"]
+    tool_names = [tool["name"] for tool in tools]
+
+    expected_tools = [
+        "create_file",
+        "read_file",
+        "write_file",
+        "delete_file",
+        "list_files",
+    ]
+    for expected_tool in expected_tools:
+        assert expected_tool in tool_names, f"Missing tool: {expected_tool}"
 
+    print("Tools list test passed")
 
-@pytest.mark.asyncio
-async def test_tools_list():
-    """Test tools listing"""
-    client = FastMCPTestClient()
 
-    try:
-        await client.start_server()
+@pytest.mark.asyncio(loop_scope="module")
+async def test_file_operations(client):
+    """Test complete file operations workflow"""
+    test_file = "test_operations.txt"
+    test_content = "Hello FastMCP Test!"
+    updated_content = "Updated FastMCP Test!"
+
+    # 1. Create file
+    create_response = await client.call_tool(
+        "create_file", file_path=test_file, content=test_content
+    )
+    assert "result" in create_response
+    assert "Successfully created" in create_response["result"]["content"][0]["text"]
+
+    # 2. Read file
+    read_response = await client.call_tool("read_file", file_path=test_file)
+    assert "result" in read_response
+    assert test_content in read_response["result"]["content"][0]["text"]
+
+    # 3. Write file (update)
+    write_response = await client.call_tool(
+        "write_file", file_path=test_file, content=updated_content
+    )
+    assert "result" in write_response
+    assert "Successfully wrote" in write_response["result"]["content"][0]["text"]
+
+    # 4. Read updated file and 5. list files (independent, run concurrently)
+    read_updated_response, list_response = await asyncio.gather(
+        client.call_tool("read_file", file_path=test_file),
+        client.call_tool("list_files"),
+    )
+    assert "result" in read_updated_response
+    assert updated_content in read_updated_response["result"]["content"][0]["text"]
+
+    assert "result" in list_response
+    assert test_file in list_response["result"]["content"][0]["text"]
+
+    # 6. Delete file
+    delete_response = await client.call_tool("delete_file", file_path=test_file)
+    assert "result" in delete_response
+    assert "Successfully deleted" in delete_response["result"]["content"][0]["text"]
+
+    print("File operations test passed")
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_error_handling(client):
+    """Test error handling"""
+    # Test reading non-existent file and path traversal protection
+    read_response, traversal_response = await client.send_batch(
+        [
+            tool_call("read_file", file_path="nonexistent.txt"),
+            tool_call("read_file", file_path="../../../etc/passwd"),
+        ]
+    )
+    assert "error" in read_response or "does not exist" in str(read_response)
 
-        # Initialize
-        await client.send_request(
-            "initialize",
-            {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {"name": "test-client", "version": "1.0.0"},
-            },
-        )
-        await client.send_notification("notifications/initialized")
+    assert "error" in traversal_response or "outside allowed directory" in str(
+        traversal_response
+    )
 
-        # Test tools/list
-        tools_response = await client.send_request("tools/list", {})
+    print("Error handling test passed")
 
-        assert "result" in tools_response
-        tools = tools_response["result"]["tools"]
-        tool_names = [tool["name"] for tool in tools]
 
-        expected_tools = [
-            "create_file",
-            "read_file",
-            "write_file",
-            "delete_file",
-            "list_files",
-        ]
-        for expected_tool in expected_tools:
-            assert expected_tool in tool_names, f"Missing tool: {expected_tool}"
+@pytest.mark.asyncio(loop_scope="module")
+async def test_file_too_large(client):
+    """Test that content over the size limit is rejected"""
+    large_content = "x" * (MAX_FILE_SIZE + 1)
 
-        print("Tools list test passed")
-        return True
+    create_response = await client.call_tool(
+        "create_file", file_path="too_large.txt", content=large_content
+    )
+    assert "exceeds limit" in str(create_response)
 
-    except Exception as e:
-        print(f"Tools list test failed: {e}")
-        return False
+    print("File size limit test passed")
 
-    finally:
-        await client.stop_server()
 
+@pytest.mark.asyncio(loop_scope="module")
+async def test_pipelined_smoke(client):
+    """Test stateless calls sent together as one pipelined write"""
+    calls = [("tools/list", {})] + [request for _, request, _ in ERROR_CASES]
+    responses = await client.send_batch(calls)
 
-@pytest.mark.asyncio
-async def test_file_operations():
-    """Test complete file operations workflow"""
-    client = FastMCPTestClient()
+    # One response per request, in request order
+    assert len(responses) == len(calls)
+    ids = [response["id"] for response in responses]
+    assert ids == sorted(ids)
 
-    try:
-        await client.start_server()
+    tools_response, *error_responses = responses
+    assert "result" in tools_response
+    for (case, _, expected), response in zip(ERROR_CASES, error_responses):
+        assert expected in str(response), f"{case}: {response}"
 
-        # Initialize
-        await client.send_request(
-            "initialize",
-            {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {"name": "test-client", "version": "1.0.0"},
-            },
-        )
-        await client.send_notification("notifications/initialized")
-
-        test_file = "test_operations.txt"
-        test_content = "Hello FastMCP Test!"
-        updated_content = "Updated FastMCP Test!"
-
-        # 1. Create file
-        create_response = await client.send_request(
-            "tools/call",
-            {
-                "name": "create_file",
-                "arguments": {"file_path": test_file, "content": test_content},
-            },
-        )
-        assert "result" in create_response
-        assert "Successfully created" in create_response["result"]["content"][0]["text"]
+    print("Pipelined smoke test passed")
 
-        # 2. Read file
-        read_response = await client.send_request(
-            "tools/call", {"name": "read_file", "arguments": {"file_path": test_file}}
-        )
-        assert "result" in read_response
-        assert test_content in read_response["result"]["content"][0]["text"]
-
-        # 3. Write file (update)
-        write_response = await client.send_request(
-            "tools/call",
-            {
-                "name": "write_file",
-                "arguments": {"file_path": test_file, "content": updated_content},
-            },
-        )
-        assert "result" in write_response
-        assert "Successfully wrote" in write_response["result"]["content"][0]["text"]
 
-        # 4. Read updated file
-        read_updated_response = await client.send_request(
-            "tools/call", {"name": "read_file", "arguments": {"file_path": test_file}}
-        )
-        assert "result" in read_updated_response
-        assert updated_content in read_updated_response["result"]["content"][0]["text"]
+def free_port():
+    """Pick a currently unused local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
 
-        # 5. List files
-        list_response = await client.send_request(
-            "tools/call", {"name": "list_files", "arguments": {}}
-        )
-        assert "result" in list_response
-        assert test_file in list_response["result"]["content"][0]["text"]
 
-        # 6. Delete file
-        delete_response = await client.send_request(
-            "tools/call", {"name": "delete_file", "arguments": {"file_path": test_file}}
-        )
-        assert "result" in delete_response
-        assert "Successfully deleted" in delete_response["result"]["content"][0]["text"]
+@contextlib.asynccontextmanager
+async def http_server(allowed_path, keys, *args):
+    """Run the HTTP server with the given auth keys on a free port
 
-        print("File operations test passed")
-        return True
+    Yields a function that builds a client authenticated with a given token.
+    """
+    port = free_port()
+    env = {name: value for name, value in os.environ.items() if name not in AUTH_KEYS}
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "fastmcp_file_server.cli",
+        "http",
+        "--port",
+        str(port),
+        *args,
+        env={**env, **keys, "MCP_ALLOWED_PATH": str(allowed_path)},
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
 
-    except Exception as e:
-        print(f"File operations test failed: {e}")
-        return False
+    def connect(token):
+        url = f"http://127.0.0.1:{port}/mcp"
+        return Client(StreamableHttpTransport(url, auth=token))
 
+    try:
+        # Wait for the server to accept connections
+        for _ in range(100):
+            try:
+                async with connect(next(iter(keys.values()))) as client:
+                    await client.ping()
+                break
+            except Exception:
+                await asyncio.sleep(0.2)
+        else:
+            raise RuntimeError("HTTP server did not start")
+
+        yield connect
     finally:
-        await client.stop_server()
+        process.terminate()
+        await process.wait()
 
 
 @pytest.mark.asyncio
-async def test_error_handling():
-    """Test error handling"""
-    client = FastMCPTestClient()
+async def test_http_workers_serialize_writes(tmp_path):
+    """Test that edits spread over several HTTP workers are not lost"""
+    lines = 200_000
+    target = tmp_path / "shared.txt"
+    target.write_text("\n".join(f"line {n}" for n in range(lines)))
 
-    try:
-        await client.start_server()
-
-        # Initialize
-        await client.send_request(
-            "initialize",
-            {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {"name": "test-client", "version": "1.0.0"},
-            },
-        )
-        await client.send_notification("notifications/initialized")
+    token = "w" * 32
+    keys = {"MCP_WRITE_KEY": token}
+    async with http_server(tmp_path, keys, "--workers", "4") as connect:
 
-        # Test reading non-existent file
-        read_response = await client.send_request(
-            "tools/call",
-            {"name": "read_file", "arguments": {"file_path": "nonexistent.txt"}},
-        )
-        assert "error" in read_response or "does not exist" in str(read_response)
+        async def insert(n):
+            async with connect(token) as client:
+                await client.call_tool(
+                    "insert_lines",
+                    {
+                        "file_path": "shared.txt",
+                        "content": f"insert {n}",
+                        "line_number": 1,
+                    },
+                )
 
-        # Test path traversal protection
-        traversal_response = await client.send_request(
-            "tools/call",
-            {"name": "read_file", "arguments": {"file_path": "../../../etc/passwd"}},
-        )
-        assert "error" in traversal_response or "outside allowed directory" in str(
-            traversal_response
-        )
+        await asyncio.gather(*(insert(n) for n in range(40)))
 
-        print("Error handling test passed")
-        return True
+    assert len(target.read_text().splitlines()) == lines + 40
 
-    except Exception as e:
-        print(f"Error handling test failed: {e}")
-        return False
 
-    finally:
-        await client.stop_server()
+@pytest.mark.asyncio
+async def test_http_scopes(tmp_path):
+    """Test that each token can call exactly the tools its scopes allow"""
+    (tmp_path / "scoped.txt").write_text("scoped")
+    keys = {
+        "MCP_READ_KEY": "r" * 32,
+        "MCP_WRITE_KEY": "w" * 32,
+        "MCP_ADMIN_KEY": "a" * 32,
+    }
+    write_args = {"file_path": "scoped.txt", "content": "written"}
+
+    async with http_server(tmp_path, keys) as connect:
+        async with connect(keys["MCP_READ_KEY"]) as client:
+            read = await client.call_tool("read_file", {"file_path": "scoped.txt"})
+            assert read.content[0].text == "File: scoped.txt\n\nscoped"
+            denied = await client.call_tool(
+                "write_file", write_args, raise_on_error=False
+            )
+            assert denied.is_error
+            assert "requires write:files" in denied.content[0].text
+
+        async with connect(keys["MCP_WRITE_KEY"]) as client:
+            await client.call_tool("write_file", write_args)
+            denied = await client.call_tool(
+                "delete_file", {"file_path": "scoped.txt"}, raise_on_error=False
+            )
+            assert denied.is_error
+            assert "requires delete:files" in denied.content[0].text
+
+        assert (tmp_path / "scoped.txt").read_text() == "written"
+
+        async with connect(keys["MCP_ADMIN_KEY"]) as client:
+            await client.call_tool("delete_file", {"file_path": "scoped.txt"})
+
+        with pytest.raises(httpx.HTTPStatusError, match="401"):
+            async with connect("x" * 32) as client:
+                await client.ping()
+
+    assert not (tmp_path / "scoped.txt").exists()
 
 
 async def run_all_tests():
@@ -283,15 +462,27 @@ async def run_all_tests():
         test_tools_list,
         test_file_operations,
         test_error_handling,
+        test_file_too_large,
+        test_pipelined_smoke,
     ]
 
     passed = 0
     total = len(tests)
 
-    for test in tests:
-        if await test():
-            passed += 1
-        print()  # Add spacing between tests
+    with tempfile.TemporaryDirectory() as allowed_path:
+        client = FastMCPTestClient(allowed_path)
+        await client.start_server()
+        try:
+            await client.initialize()
+            for test in tests:
+                try:
+                    await test(client)
+                    passed += 1
+                except Exception as e:
+                    print(f"{test.__name__} failed: {e!r}")
+                print()  # Add spacing between tests
+        finally:
+            await client.stop_server()
 
     print(f"Test Results: {passed}/{total} tests passed")
 
@@ -0,0 +1,693 @@
+import asyncio
+import base64
+import errno
+import functools
+import importlib
+import os
+import stat
+from pathlib import Path
+
+import pytest
+
+# Environment variables the server reads at import that tests must not inherit
+SERVER_ENV = (
+    "MCP_READ_KEY",
+    "MCP_WRITE_KEY",
+    "MCP_ADMIN_KEY",
+    "MCP_PATH_CACHE_SIZE",
+    "MCP_WRITE_LOCK_FILE",
+)
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    """The server module, rooted at a fresh allowed directory and without auth
+
+    The environment is only changed while the module is imported, so test
+    modules that run later see it as it was.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("MCP_ALLOWED_PATH", str(tmp_path_factory.mktemp("allowed")))
+        for name in SERVER_ENV:
+            mp.delenv(name, raising=False)
+        return importlib.import_module("fastmcp_file_server.server")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_edits_are_not_lost(server):
+    """Test that concurrent read-modify-write edits of one file all land"""
+    path = server.base_dir / "concurrent.txt"
+    path.write_text("\n".join(f"line {n}" for n in range(5000)))
+
+    await asyncio.gather(
+        *(server.insert_lines.fn("concurrent.txt", f"insert {n}", 1) for n in range(40))
+    )
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 5040
+    assert {f"insert {n}" for n in range(40)} <= set(lines)
+
+
+def write_files(server, contents):
+    """Create files under the allowed directory from a {name: text} dict"""
+    for name, text in contents.items():
+        (server.base_dir / name).write_text(text)
+
+
+def read_files(server, names):
+    """Read files under the allowed directory back into a {name: text} dict"""
+    return {name: (server.base_dir / name).read_text() for name in names}
+
+
+def leftover_files(server):
+    """Temporary or backup siblings left in the allowed directory"""
+    return sorted(path.name for path in server.base_dir.glob(".*"))
+
+
+@pytest.mark.asyncio
+async def test_batch_edit_multiple_files(server):
+    """Test batch_edit applying one edit to each of several files"""
+    write_files(server, {"edit_a.txt": "alpha", "edit_b.txt": "beta"})
+
+    result = await server.batch_edit.fn(
+        [
+            {"tool": "write_file", "file_path": "edit_a.txt", "content": "new a"},
+            {
+                "tool": "replace_in_file",
+                "file_path": "edit_b.txt",
+                "search": "bet",
+                "replace": "delt",
+            },
+        ]
+    )
+
+    assert "2 edit(s) to 2 file(s)" in result
+    assert read_files(server, ["edit_a.txt", "edit_b.txt"]) == {
+        "edit_a.txt": "new a",
+        "edit_b.txt": "delta",
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_edit_composes_edits_to_one_file(server):
+    """Test that several edits to one file apply in order"""
+    write_files(server, {"compose.txt": "one two"})
+
+    result = await server.batch_edit.fn(
+        [
+            {
+                "tool": "replace_in_file",
+                "file_path": "compose.txt",
+                "search": "one",
+                "replace": "1",
+            },
+            {
+                "tool": "replace_in_file",
+                "file_path": "compose.txt",
+                "search": "1 two",
+                "replace": "1 2",
+            },
+        ]
+    )
+
+    assert "2 edit(s) to 1 file(s)" in result
+    assert (server.base_dir / "compose.txt").read_text() == "1 2"
+
+
+@pytest.mark.asyncio
+async def test_batch_edit_missing_file_changes_nothing(server):
+    """Test that a missing file fails the batch before any file is written"""
+    write_files(server, {"present.txt": "unchanged"})
+
+    with pytest.raises(Exception, match="File does not exist: absent.txt"):
+        await server.batch_edit.fn(
+            [
+                {"tool": "write_file", "file_path": "present.txt", "content": "x"},
+                {"tool": "write_file", "file_path": "absent.txt", "content": "y"},
+            ]
+        )
+
+    assert (server.base_dir / "present.txt").read_text() == "unchanged"
+    assert not (server.base_dir / "absent.txt").exists()
+    assert leftover_files(server) == []
+
+
+@pytest.mark.asyncio
+async def test_batch_edit_rolls_back_on_failed_rename(server, monkeypatch):
+    """Test that files already replaced are restored if a later rename fails"""
+    names = ["rollback_a.txt", "rollback_b.txt", "rollback_c.txt"]
+    original = {name: f"original {name}" for name in names}
+    write_files(server, original)
+
+    real_replace = os.replace
+    renames = []
+
+    def failing_replace(src, dst):
+        # Fail the third rename into place, after two files were replaced
+        if str(src).endswith(".tmp"):
+            renames.append(dst)
+            if len(renames) == 3:
+                raise OSError("rename failed")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+
+    with pytest.raises(Exception, match="rename failed"):
+        await server.batch_edit.fn(
+            [
+                {"tool": "write_file", "file_path": name, "content": "edited"}
+                for name in names
+            ]
+        )
+
+    assert len(renames) == 3
+    assert read_files(server, names) == original
+    assert leftover_files(server) == []
+
+
+@pytest.mark.asyncio
+async def test_batch_edit_rejects_non_string_fields(server):
+    """Test that non-string paths and edit arguments are rejected by index"""
+    write_files(server, {"typed.txt": "text"})
+
+    with pytest.raises(Exception, match="Operation 2: content must be string"):
+        await server.batch_edit.fn(
+            [
+                {"tool": "write_file", "file_path": "typed.txt", "content": "ok"},
+                {"tool": "write_file", "file_path": "typed.txt", "content": 1},
+            ]
+        )
+    with pytest.raises(Exception, match="Operation 1: file_path must be string"):
+        await server.batch_edit.fn(
+            [{"tool": "write_file", "file_path": ["typed.txt"], "content": "ok"}]
+        )
+
+    assert (server.base_dir / "typed.txt").read_text() == "text"
+
+
+@pytest.mark.asyncio
+async def test_copy_falls_back_when_copy_file_range_copies_nothing(server, monkeypatch):
+    """Test that a copy_file_range reporting EOF early still copies everything"""
+    write_files(server, {"copy_source.txt": "data " * 100})
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: 0, raising=False)
+
+    await server.copy_file.fn("copy_source.txt", "copy_dest.txt")
+
+    assert (server.base_dir / "copy_dest.txt").read_text() == "data " * 100
+
+
+def simulate_cross_device(monkeypatch):
+    """Make renames fail with EXDEV, as across devices, so moves copy instead
+
+    copy_file_range is also made to copy nothing, as on filesystems that
+    do not support it, so the copy must fall back to a plain copy.
+    """
+
+    def cross_device_rename(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link", src)
+
+    monkeypatch.setattr(os, "rename", cross_device_rename)
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: 0, raising=False)
+
+
+@pytest.mark.asyncio
+async def test_cross_device_move_copies_before_removing(server, monkeypatch):
+    """Test that a cross-device move_file copies all data before unlinking"""
+    data = "moved " * 1000
+    write_files(server, {"move_source.txt": data})
+    simulate_cross_device(monkeypatch)
+
+    real_unlink = os.unlink
+    dest_sizes = []
+
+    def checked_unlink(path, *args, **kwargs):
+        dest_sizes.append((server.base_dir / "move_dest.txt").stat().st_size)
+        real_unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "unlink", checked_unlink)
+
+    await server.move_file.fn("move_source.txt", "move_dest.txt")
+
+    assert dest_sizes == [len(data)]
+    assert not (server.base_dir / "move_source.txt").exists()
+    assert (server.base_dir / "move_dest.txt").read_text() == data
+
+
+@pytest.mark.asyncio
+async def test_cross_device_move_directory(server, monkeypatch):
+    """Test that a cross-device move_directory copies every file in full"""
+    source = server.base_dir / "move_dir_source"
+    (source / "nested").mkdir(parents=True)
+    contents = {"top.txt": "top " * 500, "nested/inner.txt": "inner " * 500}
+    for name, text in contents.items():
+        (source / name).write_text(text)
+    simulate_cross_device(monkeypatch)
+
+    await server.move_directory.fn("move_dir_source", "move_dir_dest")
+
+    dest = server.base_dir / "move_dir_dest"
+    assert not source.exists()
+    assert {name: (dest / name).read_text() for name in contents} == contents
+
+
+@pytest.mark.asyncio
+async def test_find_and_replace_lines_preserves_line_endings(server):
+    """Test that replaced lines keep their CRLF, LF or missing line ending"""
+    path = server.base_dir / "crlf.txt"
+    path.write_bytes(b"keep\r\nold one\r\nkeep\nold two\r\nold end")
+
+    await server.find_and_replace_lines.fn("crlf.txt", "old", "new")
+
+    assert path.read_bytes() == b"keep\r\nnew\r\nkeep\nnew\r\nnew"
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+@pytest.mark.asyncio
+async def test_find_and_replace_lines_closes_source_before_rename(server, monkeypatch):
+    """Test that the source is closed before being replaced, as Windows needs"""
+    path = server.base_dir / "closed.txt"
+    path.write_text("old\n")
+
+    real_replace = os.replace
+    open_at_rename = []
+
+    def checked_replace(src, dst):
+        for fd in os.listdir("/proc/self/fd"):
+            try:
+                target = os.readlink(f"/proc/self/fd/{fd}")
+            except OSError:
+                continue
+            if target == str(dst):
+                open_at_rename.append(target)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", checked_replace)
+
+    await server.find_and_replace_lines.fn("closed.txt", "old", "new")
+
+    assert open_at_rename == []
+    assert path.read_text() == "new\n"
+
+
+@pytest.mark.asyncio
+async def test_search_in_file_numbers_lines_like_read_lines(server):
+    """Test that search_in_file and read_lines agree on line numbers"""
+    # \f and \x1c split lines for splitlines() but not for file iteration
+    write_files(server, {"numbering.txt": "one\ftwo\x1cthree\nfour target\n"})
+
+    result = await server.search_in_file.fn("numbering.txt", "target")
+    line = await server.read_lines.fn("numbering.txt", 4, 4)
+
+    assert result.splitlines()[1] == "4: four target"
+    assert line.splitlines()[1] == "4: four target"
+
+
+@pytest.mark.asyncio
+async def test_search_in_file_max_matches(server):
+    """Test that max_matches stops early and says the output was cut short"""
+    write_files(server, {"many.txt": "".join(f"hit {n}\n" for n in range(10))})
+
+    limited = await server.search_in_file.fn("many.txt", "hit", max_matches=3)
+    exact = await server.search_in_file.fn("many.txt", "hit", max_matches=10)
+    unlimited = await server.search_in_file.fn("many.txt", "hit")
+
+    assert limited.splitlines() == [
+        "Showing first 3 matches in many.txt:",
+        "1: hit 0",
+        "2: hit 1",
+        "3: hit 2",
+    ]
+    assert exact.startswith("Found 10 matches in many.txt:")
+    assert unlimited.startswith("Found 10 matches in many.txt:")
+
+
+@pytest.mark.asyncio
+async def test_read_file_bytes_round_trip(server):
+    """Test that read_file_bytes returns every byte value base64-encoded"""
+    data = bytes(range(256)) * 4
+    (server.base_dir / "blob.png").write_bytes(data)
+
+    result = await server.read_file_bytes.fn("blob.png")
+
+    header, encoded = result.split("\n\n", 1)
+    assert header == f"File: blob.png ({len(data)} bytes, base64)"
+    assert base64.b64decode(encoded, validate=True) == data
+
+
+@pytest.mark.asyncio
+async def test_read_file_bytes_large_file(server):
+    """Test a round-trip of a file well over a megabyte"""
+    data = os.urandom(3 << 20)
+    (server.base_dir / "large.zip").write_bytes(data)
+
+    result = await server.read_file_bytes.fn("large.zip")
+
+    header, encoded = result.split("\n\n", 1)
+    assert header == f"File: large.zip ({len(data)} bytes, base64)"
+    assert base64.b64decode(encoded, validate=True) == data
+
+
+@pytest.mark.asyncio
+async def test_read_file_bytes_empty_file(server):
+    """Test that an empty file reads as an empty payload"""
+    (server.base_dir / "empty.png").write_bytes(b"")
+
+    result = await server.read_file_bytes.fn("empty.png")
+
+    assert result == "File: empty.png (0 bytes, base64)\n\n"
+
+
+@pytest.mark.asyncio
+async def test_read_file_bytes_rejects_paths_and_extensions(server):
+    """Test that read_file_bytes refuses escaping paths and other extensions"""
+    (server.base_dir / "program.exe").write_bytes(b"MZ")
+
+    with pytest.raises(Exception, match="outside allowed directory"):
+        await server.read_file_bytes.fn("../../etc/passwd")
+    with pytest.raises(Exception, match="File extension not allowed"):
+        await server.read_file_bytes.fn("program.exe")
+
+
+@pytest.mark.asyncio
+async def test_read_cache_serves_unchanged_files(server, monkeypatch):
+    """Test that a repeat read of an unchanged file skips the disk read"""
+    write_files(server, {"cached.txt": "cached"})
+    assert await server.read_file.fn("cached.txt") == "File: cached.txt\n\ncached"
+
+    def no_disk_read(*args, **kwargs):
+        raise AssertionError("read_text called for an unchanged file")
+
+    monkeypatch.setattr(server.Path, "read_text", no_disk_read)
+
+    assert await server.read_file.fn("cached.txt") == "File: cached.txt\n\ncached"
+
+
+@pytest.mark.asyncio
+async def test_read_cache_sees_tool_edits(server):
+    """Test that edits made through tools are never hidden by the cache"""
+    write_files(server, {"tool_edit.txt": "one\n"})
+    await server.read_file.fn("tool_edit.txt")
+
+    await server.write_file.fn("tool_edit.txt", "two\n")
+    assert str(server.base_dir / "tool_edit.txt") not in server.read_cache
+    assert await server.read_file.fn("tool_edit.txt") == "File: tool_edit.txt\n\ntwo\n"
+
+    await server.replace_in_file.fn("tool_edit.txt", "two", "six")
+    assert await server.read_file.fn("tool_edit.txt") == "File: tool_edit.txt\n\nsix\n"
+
+
+@pytest.mark.asyncio
+async def test_read_cache_sees_external_edits(server):
+    """Test that a same-size outside edit with its mtime restored is seen"""
+    path = server.base_dir / "external.txt"
+    path.write_text("before")
+    await server.read_file.fn("external.txt")
+
+    st = path.stat()
+    path.write_text("after!")  # Rewritten in place: same inode, same size
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert await server.read_file.fn("external.txt") == "File: external.txt\n\nafter!"
+
+
+def test_atomic_write_replaces_contents_and_keeps_mode(server, tmp_path):
+    """Test that atomic_write swaps in new data with the old permission bits"""
+    path = tmp_path / "mode.txt"
+    path.write_bytes(b"old")
+    path.chmod(0o640)
+
+    server.atomic_write(path, b"new")
+
+    assert path.read_bytes() == b"new"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+    assert os.listdir(tmp_path) == ["mode.txt"]
+
+
+def test_atomic_open_failure_keeps_original(server, tmp_path):
+    """Test that an error mid-write leaves the original and no .tmp file"""
+    path = tmp_path / "failed.txt"
+    path.write_bytes(b"original")
+
+    with pytest.raises(RuntimeError), server.atomic_open(path) as f:
+        f.write(b"partial")
+        raise RuntimeError("write failed")
+
+    assert path.read_bytes() == b"original"
+    assert os.listdir(tmp_path) == ["failed.txt"]
+
+
+def test_atomic_open_abort_write_keeps_original(server, tmp_path):
+    """Test that AbortWrite discards the new data without raising"""
+    path = tmp_path / "aborted.txt"
+    path.write_bytes(b"original")
+
+    with server.atomic_open(path) as f:
+        f.write(b"discarded")
+        raise server.AbortWrite
+
+    assert path.read_bytes() == b"original"
+    assert os.listdir(tmp_path) == ["aborted.txt"]
+
+
+@pytest.mark.asyncio
+async def test_hashed_token_verifier(server):
+    """Test that only the exact token is accepted, with its configured scopes"""
+    verifier = server.HashedTokenVerifier(
+        tokens={
+            "correct-token": {"client_id": "reader", "scopes": ["read:files"]},
+        },
+        required_scopes=["read:files"],
+    )
+
+    access = await verifier.verify_token("correct-token")
+    assert access is not None
+    assert access.client_id == "reader"
+    assert access.scopes == ["read:files"]
+
+    assert await verifier.verify_token("wrong") is None
+    # Same length as the real token, differing only in the last character
+    assert await verifier.verify_token("correct-tokeN") is None
+
+
+@pytest.mark.asyncio
+async def test_read_file_large_file(server):
+    """Test that a multi-megabyte file reads like a small one"""
+    path = server.base_dir / "large.txt"
+    path.write_bytes(b"large line\r\n" * 200_000)
+
+    result = await server.read_file.fn("large.txt")
+
+    assert result == "File: large.txt\n\n" + "large line\n" * 200_000
+
+
+@pytest.mark.asyncio
+async def test_search_in_file_large_files(server):
+    """Test literal searches of multi-megabyte text and non-UTF-8 files"""
+    (server.base_dir / "large_text.txt").write_bytes(
+        b"filler line\n" * 200_000 + b"needle\n"
+    )
+    (server.base_dir / "large_binary.txt").write_bytes(b"\xff\xfe filler\n" * 200_000)
+
+    found = await server.search_in_file.fn("large_text.txt", "needle")
+    missing = await server.search_in_file.fn("large_text.txt", "absent")
+
+    assert found == "Found 1 matches in large_text.txt:\n200001: needle"
+    assert missing == "No matches found for 'absent' in large_text.txt"
+    with pytest.raises(Exception, match="not text readable"):
+        await server.search_in_file.fn("large_binary.txt", "absent")
+
+
+@pytest.mark.asyncio
+async def test_append_lines_separator(server):
+    """Test that a newline is added only when the file does not end with one"""
+    existing = {
+        "append_lf.txt": b"one\n",
+        "append_crlf.txt": b"one\r\n",
+        "append_none.txt": b"one",
+        "append_empty.txt": b"",
+    }
+    for name, data in existing.items():
+        (server.base_dir / name).write_bytes(data)
+
+    for name in existing:
+        await server.append_lines.fn(name, "two")
+
+    appended = {name: (server.base_dir / name).read_bytes() for name in existing}
+    assert appended == {
+        "append_lf.txt": b"one\ntwo",
+        "append_crlf.txt": b"one\r\ntwo",
+        "append_none.txt": b"one\ntwo",
+        "append_empty.txt": b"\ntwo",
+    }
+
+
+@pytest.mark.asyncio
+async def test_append_lines_rejects_binary_files(server):
+    """Test that appending to a non-UTF-8 file fails and leaves it untouched"""
+    data = b"text\n" * 1000 + b"\xff\xfe\x00binary\n"
+    path = server.base_dir / "append_binary.txt"
+    path.write_bytes(data)
+
+    with pytest.raises(Exception, match="not text readable"):
+        await server.append_lines.fn("append_binary.txt", "more")
+
+    assert path.read_bytes() == data
+
+
+def test_path_resolution_sees_outside_symlink_swaps(server, tmp_path):
+    """Test that a directory swapped for an outside symlink is caught"""
+    (server.base_dir / "swapped").mkdir()
+    assert server.validate_path("swapped/file.txt").parent.name == "swapped"
+
+    (server.base_dir / "swapped").rmdir()
+    (server.base_dir / "swapped").symlink_to(tmp_path, target_is_directory=True)
+
+    with pytest.raises(ValueError, match="outside allowed directory"):
+        server.validate_path("swapped/file.txt")
+
+
+@pytest.mark.asyncio
+async def test_path_cache_hits_and_invalidation(server, monkeypatch):
+    """Test that an enabled path cache serves repeats and clears on delete"""
+    cached = functools.lru_cache(maxsize=8)(server.resolve_path.__wrapped__)
+    monkeypatch.setattr(server, "resolve_path", cached)
+    write_files(server, {"path_cached.txt": "x"})
+
+    first = server.validate_path("path_cached.txt")
+    assert server.validate_path("/path_cached.txt") is first
+    assert cached.cache_info().hits == 1
+
+    await server.delete_file.fn("path_cached.txt")
+    assert cached.cache_info().currsize == 0
+
+
+@pytest.mark.asyncio
+async def test_extension_check_uses_requested_name(server):
+    """Test that the allow-list applies to the requested name, not a link target"""
+    write_files(server, {"link_target.txt": "text"})
+    (server.base_dir / "link_data.bin").write_bytes(b"data")
+    (server.base_dir / "link_alias.exe").symlink_to("link_target.txt")
+    (server.base_dir / "link_alias.txt").symlink_to("link_data.bin")
+
+    with pytest.raises(Exception, match="File extension not allowed"):
+        await server.write_file.fn("link_alias.exe", "rejected")
+    await server.write_file.fn("link_alias.txt", "accepted")
+
+    assert (server.base_dir / "link_target.txt").read_text() == "text"
+    assert (server.base_dir / "link_data.bin").read_text() == "accepted"
+
+
+# (path, contents) of a tree with hidden entries, mixed case and nesting
+WALK_TREE = [
+    ("a.txt", "a"),
+    ("B.TXT", "b"),
+    (".hidden.txt", "h"),
+    ("notes.md", "n"),
+    (".hidden_dir/inner.txt", "i"),
+    ("sub/Y.Txt", "y"),
+    ("sub/z.log", "z"),
+    ("sub/deep/x.md", "x"),
+    ("sub/deep/more/w.txt", "w"),
+    ("sub/deep/more/.w.txt", "w"),
+]
+
+
+@pytest.fixture(scope="module")
+def walk_tree(server):
+    """A small tree under the allowed directory, with symlinks to a file and a directory"""
+    root = server.base_dir / "walk_tree"
+    for name, text in WALK_TREE:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(text)
+    (root / "link_dir").symlink_to("sub", target_is_directory=True)
+    (root / "link_file.txt").symlink_to("a.txt")
+    return root
+
+
+@pytest.mark.parametrize("concurrent", [True, False])
+def test_walk_entries_matches_rglob(server, walk_tree, monkeypatch, concurrent):
+    """Test that walk_entries yields what rglob("*") does, in the same order"""
+    if concurrent:
+        monkeypatch.setattr(server, "WALK_PREFETCH", 1)
+    else:
+        monkeypatch.setattr(server, "walk_executor", None)
+
+    walked = [entry.path for entry in server.walk_entries(walk_tree)]
+
+    assert walked == [str(path) for path in walk_tree.rglob("*")]
+
+
+def test_walk_entries_stops_scanning_when_closed(server, tmp_path, monkeypatch):
+    """Test that an abandoned walk does not scan the rest of the tree"""
+    for n in range(50):
+        (tmp_path / f"dir{n}" / "nested").mkdir(parents=True)
+    real_scan = server.scan_directory
+    scanned = []
+
+    def counting_scan(path):
+        scanned.append(path)
+        return real_scan(path)
+
+    monkeypatch.setattr(server, "scan_directory", counting_scan)
+
+    walk = server.walk_entries(tmp_path)
+    next(walk)
+    walk.close()
+
+    assert len(scanned) <= 1 + server.WALK_PREFETCH
+
+
+@pytest.mark.parametrize("pattern", [None, "*.txt", ".*", "deep/*"])
+@pytest.mark.asyncio
+async def test_list_files_recursive_matches_rglob(server, walk_tree, pattern):
+    """Test that list_files_recursive lists what rglob("*") and Path.match select"""
+    result = await server.list_files_recursive.fn("walk_tree", pattern)
+
+    listed = [line.rsplit(" (", 1)[0] for line in result.splitlines()[1:]]
+    expected = [
+        (
+            f"directory: {server.to_relative(path)}/"
+            if path.is_dir()
+            else f"file: {server.to_relative(path)}"
+        )
+        for path in walk_tree.rglob("*")
+        if pattern is None or path.match(pattern)
+    ]
+    assert listed == expected
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        "*",
+        "*.txt",
+        "*.TXT",
+        ".*",
+        "?.txt",
+        "[a-c]*",
+        "sub/*",
+        "*/deep/*.md",
+        "inner.txt",
+    ],
+)
+def test_entry_matcher_matches_path_match(server, walk_tree, pattern):
+    """Test that entry_matcher agrees with Path.match on every entry"""
+    matches = server.entry_matcher(pattern)
+
+    for entry in server.walk_entries(walk_tree):
+        assert matches(entry) == Path(entry.path).match(pattern), entry.path
+
+
+@pytest.mark.parametrize(
+    "pattern", ["*", "*.txt", "*.TXT", ".*", "*.md", "w.txt", "sub/*.log", "**/*.md"]
+)
+@pytest.mark.asyncio
+async def test_find_files_matches_rglob(server, walk_tree, pattern):
+    """Test that find_files lists the same files as rglob, whichever path it takes"""
+    result = await server.find_files.fn("walk_tree", pattern)
+
+    found = [line.rsplit(" (", 1)[0] for line in result.splitlines()[1:]]
+    expected = [
+        server.to_relative(path) for path in walk_tree.rglob(pattern) if path.is_file()
+    ]
+    assert found == expected